@@ -32,25 +32,18 @@ class CoffeeLotQueryService:
 
     def handle_get_coffee_lots_by_producer(self, query: GetCoffeeLotsByProducerQuery) -> list[type[CoffeeLot]]:
         """Lista los lotes filtrados por productor y criterios opcionales"""
-        # Obtener todos los lotes del productor primero
-        lots = self.repository.find_by_producer_id(query.producer_id)
-
-        # Filtrar por estado si se especifica
+        status_enum = None
         if query.status:
             try:
                 status_enum = LotStatus[query.status.upper()]
-                lots = [lot for lot in lots if lot.status == status_enum]
             except KeyError:
                 raise HTTPException(
                     status_code=status.HTTP_400_BAD_REQUEST,
                     detail=f"Invalid status: {query.status}"
                 )
 
-        # Filtrar por año de cosecha si se especifica
-        if query.harvest_year:
-            lots = [lot for lot in lots if lot.harvest_date.year == query.harvest_year]
-
-        return lots
+        # Los filtros se aplican en la base de datos, no sobre la lista en memoria
+        return self.repository.find_by_producer_id_filtered(query.producer_id, status_enum, query.harvest_year)
 
     def handle_search_coffee_lots(self, query: SearchCoffeeLotsQuery) -> list[type[CoffeeLot]]:
         """Búsqueda avanzada de lotes con múltiples criterios"""
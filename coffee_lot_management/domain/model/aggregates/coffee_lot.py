@@ -1,7 +1,7 @@
 import enum
 from datetime import date
 
-from sqlalchemy import Column, Integer, String, Float, Date, Enum as SQLEnum, ForeignKey
+from sqlalchemy import Column, Integer, String, Float, Date, Enum as SQLEnum, ForeignKey, Index
 from sqlalchemy.dialects.postgresql import Any
 from sqlalchemy.orm import relationship
 
@@ -39,6 +39,12 @@ class CoffeeLot(AuditableAbstractAggregateRoot):
     Agregado CoffeeLot - Gestiona el ciclo de vida de lotes de café
     """
     __tablename__ = "coffee_lots"
+    __table_args__ = (
+        # Búsqueda avanzada: filtros de igualdad + rango por fecha de cosecha
+        Index("ix_coffee_lots_search", "coffee_variety", "processing_method", "status", "harvest_date"),
+        # Lotes de un productor filtrados por estado y año de cosecha
+        Index("ix_coffee_lots_producer_status_harvest", "producer_id", "status", "harvest_date"),
+    )
 
     lot_number = Column(String(50), unique=True, nullable=False, index=True)
     producer_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -0,0 +1,12 @@
+from sqlalchemy import Column, Integer
+from shared.domain.database import Base
+
+
+class LotCounter(Base):
+    """
+    Entidad LotCounter - Último secuencial de número de lote emitido por año
+    """
+    __tablename__ = "lot_counters"
+
+    year = Column(Integer, primary_key=True, autoincrement=False)
+    last_seq = Column(Integer, nullable=False)
\ No newline at end of file
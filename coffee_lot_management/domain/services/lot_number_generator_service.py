@@ -1,7 +1,29 @@
 from datetime import datetime
 from sqlalchemy.orm import Session
 from sqlalchemy import text
-from coffee_lot_management.infrastructure.persistence.database.repositories.coffee_lot_repository import CoffeeLotRepository
+from coffee_lot_management.domain.model.entities.lot_counter import LotCounter
+
+# Incrementa el contador del año y retorna el nuevo secuencial (una sola consulta)
+_NEXT_SEQUENTIAL_SQL = text(
+    f"""
+    UPDATE {LotCounter.__tablename__} SET last_seq = last_seq + 1
+    WHERE year = :year
+    RETURNING last_seq
+    """
+)
+
+# Primer lote del año: crea el contador continuando desde los lotes ya existentes.
+# ON CONFLICT cubre la carrera de dos registros simultáneos al inicio del año.
+_INIT_SEQUENTIAL_SQL = text(
+    f"""
+    INSERT INTO {LotCounter.__tablename__} (year, last_seq)
+    SELECT :year, COALESCE(MAX(CAST(SUBSTRING(lot_number FROM 10) AS INTEGER)), 0) + 1
+    FROM coffee_lots
+    WHERE lot_number LIKE :prefix
+    ON CONFLICT (year) DO UPDATE SET last_seq = {LotCounter.__tablename__}.last_seq + 1
+    RETURNING last_seq
+    """
+)
 
 
 class LotNumberGeneratorService:
@@ -12,38 +34,25 @@ class LotNumberGeneratorService:
 
     def __init__(self, db: Session):
         self.db = db
-        self.repository = CoffeeLotRepository(db)
 
     def generate_lot_number(self) -> str:
         """
         Genera un número único de lote para un productor
         Formato: LOT-YYYY-NNNN
+
+        El secuencial se obtiene del contador por año (tabla lot_counters), que se
+        bloquea a nivel de fila hasta el commit del lote: sin COUNT(*) sobre
+        coffee_lots ni consultas extra para verificar unicidad.
         """
         current_year = datetime.now().year
 
-        # --- 2. CORRECCIÓN: ENVOLVER LA CONSULTA EN text() ---
-        # Usamos :year como un "parámetro vinculado" (parameter binding)
-        # para evitar la inyección SQL, en lugar de un f-string.
-        sql_query = text(
-            """
-            SELECT COUNT(*) FROM coffee_lots 
-            WHERE EXTRACT(YEAR FROM created_at) = :year
-            """
-        )
+        sequential = self.db.execute(_NEXT_SEQUENTIAL_SQL, {"year": current_year}).scalar()
 
-        # --- 3. EJECUTAR LA CONSULTA PASANDO LOS PARÁMETROS ---
-        result = self.db.execute(sql_query, {"year": current_year})
-        lots_this_year = result.scalar()
-
-        # Incrementar el secuencial (tu lógica original)
-        sequential = (lots_this_year or 0) + 1
+        if sequential is None:
+            sequential = self.db.execute(
+                _INIT_SEQUENTIAL_SQL,
+                {"year": current_year, "prefix": f"LOT-{current_year}-%"}
+            ).scalar()
 
         # Formato: LOT-2024-0001
-        lot_number = f"LOT-{current_year}-{sequential:04d}"
-
-        # Verificar unicidad (tu lógica original)
-        while self.repository.exists_by_lot_number(lot_number):
-            sequential += 1
-            lot_number = f"LOT-{current_year}-{sequential:04d}"
-
-        return lot_number
\ No newline at end of file
+        return f"LOT-{current_year}-{sequential:04d}"
\ No newline at end of file
@@ -1,6 +1,9 @@
+import threading
 from datetime import date
 from typing import Optional
 
+from cachetools import TTLCache
+from sqlalchemy import event
 from sqlalchemy.orm import Session
 
 from coffee_lot_management.domain.model.aggregates.coffee_lot import CoffeeLot, LotStatus, CoffeeVariety
@@ -31,6 +34,20 @@ class CoffeeLotRepository:
         """Obtiene todos los lotes de un productor"""
         return self.db.query(CoffeeLot).filter(CoffeeLot.producer_id == producer_id).all()
 
+    def find_by_producer_id_filtered(self, producer_id: int, status: Optional[LotStatus] = None,
+                                     harvest_year: Optional[int] = None) -> list[type[CoffeeLot]]:
+        """Obtiene lotes de un productor aplicando en SQL los filtros opcionales de estado y año de cosecha"""
+        query = self.db.query(CoffeeLot).filter(CoffeeLot.producer_id == producer_id)
+        if status is not None:
+            query = query.filter(CoffeeLot.status == status)
+        if harvest_year is not None:
+            # Rango de fechas en lugar de EXTRACT(YEAR) para aprovechar el índice
+            query = query.filter(
+                CoffeeLot.harvest_date >= date(harvest_year, 1, 1),
+                CoffeeLot.harvest_date <= date(harvest_year, 12, 31)
+            )
+        return query.all()
+
     def find_by_producer_id_and_status(self, producer_id: int, status: LotStatus) -> list[type[CoffeeLot]]:
         """Obtiene lotes de un productor filtrados por estado"""
         return self.db.query(CoffeeLot).filter(
@@ -63,4 +80,34 @@ class CoffeeLotRepository:
     def delete(self, coffee_lot: CoffeeLot) -> None:
         """Elimina un lote de café"""
         self.db.delete(coffee_lot)
-        self.db.commit()
\ No newline at end of file
+        self.db.commit()
+
+
+# Caché en proceso de números de lote (id -> lot_number) para reportes y notificaciones
+_lot_number_cache = TTLCache(maxsize=1024, ttl=60)
+_lot_number_cache_lock = threading.Lock()
+
+
+def get_lot_number_cached(db: Session, coffee_lot_id: int) -> Optional[str]:
+    """
+    Obtiene el número de lote por ID, reutilizando el resultado durante 60 segundos.
+    Los lotes no encontrados no se cachean: un lote recién creado aparece en el siguiente intento.
+    """
+    with _lot_number_cache_lock:
+        lot_number = _lot_number_cache.get(coffee_lot_id)
+    if lot_number is not None:
+        return lot_number
+
+    lot_number = db.query(CoffeeLot.lot_number).filter(CoffeeLot.id == coffee_lot_id).scalar()
+    if lot_number is not None:
+        with _lot_number_cache_lock:
+            _lot_number_cache[coffee_lot_id] = lot_number
+    return lot_number
+
+
+@event.listens_for(CoffeeLot, "after_update")
+@event.listens_for(CoffeeLot, "after_delete")
+def _invalidate_lot_number_cache(_mapper, _connection, target: CoffeeLot) -> None:
+    """Invalida la entrada cacheada cuando el lote cambia o se elimina"""
+    with _lot_number_cache_lock:
+        _lot_number_cache.pop(target.id, None)
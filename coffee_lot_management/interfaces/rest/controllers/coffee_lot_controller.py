@@ -16,7 +16,7 @@ from coffee_lot_management.domain.model.commands.update_coffee_lot_command impor
 from coffee_lot_management.domain.model.queries.get_coffee_lot_by_id_query import GetCoffeeLotByIdQuery
 from coffee_lot_management.domain.model.queries.get_coffee_lots_by_producer_query import GetCoffeeLotsByProducerQuery
 from coffee_lot_management.domain.model.queries.search_coffee_lots_query import SearchCoffeeLotsQuery
-from shared.domain.database import get_db
+from shared.domain.database import get_db, get_ro_db
 
 router = APIRouter(prefix="/api/v1/coffee-lots", tags=["Coffee Lot Management"])
 
@@ -115,7 +115,7 @@ async def register_coffee_lot(
 @router.get("/{lot_id}", response_model=CoffeeLotResource)
 async def get_coffee_lot(
         lot_id: int,
-        db: Session = Depends(get_db)
+        db: Session = Depends(get_ro_db)
 ):
     """Obtiene información de un lote específico"""
     query = GetCoffeeLotByIdQuery(lot_id=lot_id)
@@ -172,7 +172,7 @@ async def get_lots_by_producer(
         producer_id: int,
         producer_status: Optional[LotStatusEnum] = Query(None, description="Filtrar por estado"),
         harvest_year: Optional[int] = Query(None, description="Filtrar por año de cosecha"),
-        db: Session = Depends(get_db)
+        db: Session = Depends(get_ro_db)
 ):
     """Obtiene todos los lotes de un productor"""
     query = GetCoffeeLotsByProducerQuery(
@@ -192,7 +192,7 @@ async def search_coffee_lots(
         coffee_status: Optional[LotStatusEnum] = Query(None, description="Filtrar por estado del lote"),
         start_date: Optional[date] = Query(None, description="Fecha de cosecha desde (inclusive)"),
         end_date: Optional[date] = Query(None, description="Fecha de cosecha hasta (inclusive)"),
-        db: Session = Depends(get_db)
+        db: Session = Depends(get_ro_db)
 ):
     """Búsqueda avanzada de lotes de café con múltiples filtros"""
     query = SearchCoffeeLotsQuery(
@@ -1,7 +1,8 @@
 from typing import Optional
 
-from sqlalchemy import func
-from sqlalchemy.orm import Session, joinedload
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
 
 from grain_classification.domain.model.aggregates.classification_session import ClassificationSession
 from grain_classification.domain.model.aggregates.grain_analysis import GrainAnalysis
@@ -9,53 +10,58 @@ from grain_classification.domain.model.aggregates.grain_analysis import GrainAna
 
 class ClassificationQueryService:
     """
-    Servicio para consultas de lectura sobre sesiones de clasificación
+    Servicio para consultas de lectura sobre sesiones de clasificación.
+    Usa la sesión asíncrona: las consultas no bloquean el event loop.
     """
 
-    def __init__(self, db: Session):
+    def __init__(self, db: AsyncSession):
         self.db = db
 
 
     """
     Obtiene TODAS las sesiones de clasificación
     """
-    def get_all_sessions(self) -> list[type[ClassificationSession]]:
-        return (
-            self.db.query(ClassificationSession)
-            .options(joinedload(ClassificationSession.analyses))
+    async def get_all_sessions(self) -> list[ClassificationSession]:
+        stmt = (
+            select(ClassificationSession)
+            .options(selectinload(ClassificationSession.analyses))
             .order_by(ClassificationSession.created_at.desc())
-            .all()
         )
+        result = await self.db.execute(stmt)
+        return list(result.scalars().all())
 
 
     """
     Obtiene todas las sesiones de clasificación de un lote de café
     """
-    def get_sessions_by_coffee_lot(self, coffee_lot_id: int) -> list[type[ClassificationSession]]:
-        return (
-            self.db.query(ClassificationSession)
-            .filter(ClassificationSession.coffee_lot_id == coffee_lot_id)
-            .options(joinedload(ClassificationSession.analyses))
+    async def get_sessions_by_coffee_lot(self, coffee_lot_id: int) -> list[ClassificationSession]:
+        stmt = (
+            select(ClassificationSession)
+            .where(ClassificationSession.coffee_lot_id == coffee_lot_id)
+            .options(selectinload(ClassificationSession.analyses))
             .order_by(ClassificationSession.created_at.desc())
-            .all()
         )
+        result = await self.db.execute(stmt)
+        return list(result.scalars().all())
 
 
     """
     Calcula la calidad promedio de TODOS los granos (sin filtro por lote)
     """
-    def get_overall_average_quality(self) -> Optional[dict]:
-        result = (
-            self.db.query(
+    async def get_overall_average_quality(self) -> Optional[dict]:
+        # Agregado en SQL con Core: una sola fila, sin instanciar objetos del ORM
+        stmt = (
+            select(
                 func.avg(GrainAnalysis.final_score).label('avg_score'),
                 func.count(GrainAnalysis.id).label('total_grains'),
                 func.count(func.distinct(ClassificationSession.coffee_lot_id)).label('total_lots')
             )
+            .select_from(GrainAnalysis)
             .join(ClassificationSession)
-            .first()
         )
+        result = (await self.db.execute(stmt)).one()
 
-        if result and result.avg_score is not None:
+        if result.avg_score is not None:
             # Convertir de 0-1 a 0-100%
             avg_percentage = round(float(result.avg_score) * 100, 2)
             return {
@@ -71,18 +77,19 @@ class ClassificationQueryService:
     """
     Calcula la calidad promedio de todos los granos de un lote (0-100%)
     """
-    def get_average_quality_by_coffee_lot(self, coffee_lot_id: int) -> Optional[dict]:
-        result = (
-            self.db.query(
+    async def get_average_quality_by_coffee_lot(self, coffee_lot_id: int) -> Optional[dict]:
+        stmt = (
+            select(
                 func.avg(GrainAnalysis.final_score).label('avg_score'),
                 func.count(GrainAnalysis.id).label('total_grains')
             )
+            .select_from(GrainAnalysis)
             .join(ClassificationSession)
-            .filter(ClassificationSession.coffee_lot_id == coffee_lot_id)
-            .first()
+            .where(ClassificationSession.coffee_lot_id == coffee_lot_id)
         )
+        result = (await self.db.execute(stmt)).one()
 
-        if result and result.avg_score is not None:
+        if result.avg_score is not None:
             # Convertir de 0-1 a 0-100%
             avg_percentage = round(float(result.avg_score) * 100, 2)
             return {
@@ -98,10 +105,11 @@ class ClassificationQueryService:
     """
     Obtiene una sesión específica con todos sus análisis
     """
-    def get_session_by_id(self, session_id: int) -> Optional[ClassificationSession]:
-        return (
-            self.db.query(ClassificationSession)
-            .filter(ClassificationSession.id == session_id)
-            .options(joinedload(ClassificationSession.analyses))
-            .first()
-        )
\ No newline at end of file
+    async def get_session_by_id(self, session_id: int) -> Optional[ClassificationSession]:
+        stmt = (
+            select(ClassificationSession)
+            .where(ClassificationSession.id == session_id)
+            .options(selectinload(ClassificationSession.analyses))
+        )
+        result = await self.db.execute(stmt)
+        return result.scalar_one_or_none()
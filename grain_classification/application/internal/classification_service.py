@@ -1,8 +1,11 @@
+import logging
 import time
-import cv2
+import numpy as np
 from sqlalchemy.orm import Session
-from typing import Optional
+from typing import BinaryIO, Callable, Optional
 
+from coffee_lot_management.infrastructure.persistence.database.repositories.coffee_lot_repository import \
+    get_lot_number_cached
 from grain_classification.domain.model.aggregates.classification_session import ClassificationSession
 from grain_classification.domain.model.aggregates.grain_analysis import GrainAnalysis
 from grain_classification.domain.model.valueobjetcs.quality_models import CNN_CLASS_TO_SCORE_MAP
@@ -12,8 +15,11 @@ from grain_classification.infrastructure.ml_predictor_service import MLPredictor
 from grain_classification.infrastructure.cloudinary_service import CloudinaryService
 from grain_classification.infrastructure.persistence.database.repositories.classification_session_repository import \
     ClassificationSessionRepository
+from shared.infrastructure.mail_queue import mail_queue
 from shared.infrastructure.notification_service import email_service
 
+logger = logging.getLogger(__name__)
+
 
 class ClassificationApplicationService:
     """
@@ -33,6 +39,28 @@ class ClassificationApplicationService:
     def start_classification_session(self, coffee_lot_id: int, image_bytes: bytes,
                                      user_id: int, user_email: Optional[str] = None,
                                      send_email_notification: bool = False) -> ClassificationSession:
+        return self._run_classification(
+            coffee_lot_id,
+            lambda: self.cv_service.load_image_from_bytes(image_bytes),
+            user_id, user_email, send_email_notification
+        )
+
+    def start_classification_session_stream(self, coffee_lot_id: int, image_file: BinaryIO,
+                                            user_id: int, user_email: Optional[str] = None,
+                                            send_email_notification: bool = False) -> ClassificationSession:
+        """
+        Igual que start_classification_session, pero decodifica la imagen directamente
+        desde el archivo subido sin materializarla antes en un objeto bytes.
+        """
+        return self._run_classification(
+            coffee_lot_id,
+            lambda: self.cv_service.load_image_from_file(image_file),
+            user_id, user_email, send_email_notification
+        )
+
+    def _run_classification(self, coffee_lot_id: int, load_image: Callable[[], Optional[np.ndarray]],
+                            user_id: int, user_email: Optional[str],
+                            send_email_notification: bool) -> ClassificationSession:
 
         start_time = time.time()
 
@@ -41,7 +69,7 @@ class ClassificationApplicationService:
 
         try:
             # 2. Cargar y segmentar (Infraestructura CV)
-            original_image = self.cv_service.load_image_from_bytes(image_bytes)
+            original_image = load_image()
             if original_image is None:
                 raise ValueError("No se pudo cargar la imagen")
 
@@ -49,42 +77,37 @@ class ClassificationApplicationService:
             if not beans_data:
                 raise ValueError("No se detectaron granos en la imagen")
 
-            bean_assessments_for_report = []
-
-            # 3. Bucle de análisis de granos
-            for idx, bean_data in enumerate(beans_data):
-                bean_image = bean_data['image']
-                contour = bean_data['contour']
-
-                features = self.cv_service.extract_all_features(bean_image, contour)
-
-                rgb_image_for_model = cv2.cvtColor(bean_image, cv2.COLOR_BGR2RGB)
-                model_input = cv2.resize(rgb_image_for_model, (224, 224))
-
-                # 4. Predecir (Infraestructura IA)
-                color_percentages = self.ml_predictor.predict_color_percentages(model_input)
-                if color_percentages is None:
-                    raise Exception("Modelo CNN no disponible o falló la predicción.")
-
-                # 5. Obtener puntuación base (Dominio)
-                winning_class = max(color_percentages, key=color_percentages.get)
-                base_score = CNN_CLASS_TO_SCORE_MAP.get(winning_class, 0.0)
-
-                # 6. Obtener puntuación final (Dominio)
-                quality_result = self.grading_service.calculate_final_quality(
-                    base_score, winning_class, features
-                )
-
-                # 7. Subir imagen a Cloudinary (NUEVO)
-                # Nota: session.id aún no existe, usaremos un ID temporal
-                session_id_temp = f"temp_{int(time.time())}_{coffee_lot_id}"
-                upload_result = self.cloudinary_service.upload_grain_image(
-                    bean_image,
-                    session_id_temp,
-                    idx
-                )
-
-                # 8. Crear la Entidad y añadirla a la sesión
+            # 3. Preparar el lote de entrada del modelo (todos los granos en un solo tensor)
+            model_inputs = self.cv_service.prepare_model_batch(beans_data)
+
+            # 4. Predecir todo el lote en una sola llamada, agrupada con otros requests (Infraestructura IA)
+            batch_color_percentages = self.ml_predictor.predict_color_percentages_coalesced(model_inputs)
+            if batch_color_percentages is None:
+                raise Exception("Modelo CNN no disponible o falló la predicción.")
+
+            # 5. Subir todas las imágenes a Cloudinary en paralelo
+            # Nota: session.id aún no existe, usaremos un ID temporal
+            session_id_temp = f"temp_{int(time.time())}_{coffee_lot_id}"
+            upload_results = self.cloudinary_service.upload_grain_images_bulk(
+                [bean_data['image'] for bean_data in beans_data],
+                session_id_temp
+            )
+
+            # 6. Extraer características de todos los granos en paralelo (Infraestructura CV)
+            features_list = self.cv_service.extract_all_features_bulk(beans_data)
+
+            # 7. Obtener puntuación base por grano (Dominio)
+            winning_classes = [max(cp, key=cp.get) for cp in batch_color_percentages]
+            base_scores = np.array([CNN_CLASS_TO_SCORE_MAP.get(c, 0.0) for c in winning_classes])
+
+            # 8. Obtener puntuación final de todo el lote (Dominio)
+            bean_assessments_for_report = self.grading_service.grade_batch(
+                base_scores, winning_classes, features_list
+            )
+
+            # 9. Crear las Entidades y añadirlas a la sesión
+            for features, color_percentages, quality_result, upload_result in zip(
+                    features_list, batch_color_percentages, bean_assessments_for_report, upload_results):
                 analysis = GrainAnalysis(
                     features=features,
                     color_percentages=color_percentages,
@@ -95,34 +118,30 @@ class ClassificationApplicationService:
                     cloudinary_public_id=upload_result.get('public_id')
                 )
                 session.analyses.append(analysis)
-                bean_assessments_for_report.append(quality_result)
 
-            # 9. Generar reporte de lote (Dominio)
+            # 10. Generar reporte de lote (Dominio)
             batch_report = self.grading_service.generate_batch_report(bean_assessments_for_report)
 
-            # 10. Finalizar la sesión (Agregado)
+            # 11. Finalizar la sesión (Agregado)
             time_taken = time.time() - start_time
             session.complete(batch_report, time_taken)
 
         except Exception as e:
             session.fail(str(e))
 
-        # 11. Persistir el Agregado (Repositorio)
+        # 12. Persistir el Agregado (Repositorio)
         self.repo.add(session)
         self.repo.commit()
         self.repo.refresh(session)
 
-        # 12. Enviar notificación por email si está habilitada y hay email
+        # 13. Enviar notificación por email si está habilitada y hay email
         if send_email_notification and user_email and session.status == "COMPLETED":
             try:
                 # Obtener datos del lote de café (opcional)
-                from coffee_lot_management.infrastructure.persistence.database.repositories.coffee_lot_repository import \
-                    CoffeeLotRepository
-                lot_repo = CoffeeLotRepository(self.db)
-                coffee_lot = lot_repo.find_by_id(coffee_lot_id)
-                
+                lot_number = get_lot_number_cached(self.db, coffee_lot_id)
+
                 coffee_lot_data = {
-                    'lot_number': coffee_lot.lot_number if coffee_lot else 'N/A'
+                    'lot_number': lot_number or 'N/A'
                 }
 
                 # Si es un solo grano, agregar sus datos específicos
@@ -140,14 +159,23 @@ class ClassificationApplicationService:
                     'completed_at': session.completed_at
                 }
 
-                email_service.send_classification_report(
-                    recipient_email=user_email,
-                    classification_data=session_dict,
-                    coffee_lot_data=coffee_lot_data
-                )
-                print(f"Notificación enviada a {user_email}")
+                if mail_queue.running:
+                    # Se envía desde el worker de la cola, fuera del tiempo de respuesta
+                    mail_queue.submit_threadsafe({
+                        'recipient_email': user_email,
+                        'classification_data': session_dict,
+                        'coffee_lot_data': coffee_lot_data
+                    })
+                    logger.info("Notificación en cola para %s", user_email)
+                else:
+                    email_service.send_classification_report(
+                        recipient_email=user_email,
+                        classification_data=session_dict,
+                        coffee_lot_data=coffee_lot_data
+                    )
+                    logger.info("Notificación enviada a %s", user_email)
             except Exception as e:
-                print(f"Error al enviar notificación por email: {e}")
+                logger.error("Error al enviar notificación por email: %s", e)
                 # No fallamos toda la clasificación si falla el envío de email
 
         return session
\ No newline at end of file
@@ -1,7 +1,20 @@
 # grain_classification/domain/services/grading_service.py
 
+import bisect
+from collections import Counter
 from typing import Dict, Any, List
-from grain_classification.domain.model.valueobjetcs.quality_models import QUALITY_THRESHOLDS
+
+import numpy as np
+
+from grain_classification.domain.model.valueobjetcs.quality_models import QUALITY_THRESHOLDS, QUALITY_CATEGORIES
+
+# Umbrales ordenados de menor a mayor para búsqueda vectorizada de categoría
+_SORTED_CATEGORIES = np.array(sorted(QUALITY_THRESHOLDS, key=QUALITY_THRESHOLDS.get))
+_SORTED_THRESHOLDS = np.array([QUALITY_THRESHOLDS[category] for category in _SORTED_CATEGORIES])
+
+# Mismos umbrales como listas de Python para la búsqueda escalar con bisect
+_THRESHOLD_LIST = _SORTED_THRESHOLDS.tolist()
+_CATEGORY_LIST = _SORTED_CATEGORIES.tolist()
 
 
 class QualityGradingService:
@@ -56,21 +69,61 @@ class QualityGradingService:
             'color_class': winning_class
         }
 
+    @staticmethod
+    def grade_batch(
+            base_scores: np.ndarray,
+            winning_classes: List[str],
+            features_list: List[Dict[str, Any]]
+    ) -> List[Dict[str, Any]]:
+        """
+        Versión vectorizada de calculate_final_quality para todos los granos de una sesión.
+        Aplica las mismas reglas sobre arreglos NumPy y retorna un resultado por grano.
+        """
+        total_beans = len(features_list)
+        circularity = np.fromiter((f.get('circularity', 0) for f in features_list), dtype=np.float64,
+                                  count=total_beans)
+        area = np.fromiter((f.get('area', 0) for f in features_list), dtype=np.float64, count=total_beans)
+
+        # Ajustes por forma y tamaño
+        shape_penalty = circularity < 0.7
+        size_penalty = area < 500
+        size_bonus = area > 2000
+
+        final_scores = (np.asarray(base_scores, dtype=np.float64)
+                        + np.where(shape_penalty, -0.05, 0.0)
+                        + np.select([size_penalty, size_bonus], [-0.03, 0.02], 0.0))
+        final_scores = np.clip(final_scores, 0.0, 1.0)
+
+        # Determinar categorías de calidad en una sola búsqueda
+        category_idx = np.searchsorted(_SORTED_THRESHOLDS, final_scores, side='right') - 1
+        categories = _SORTED_CATEGORIES[category_idx].tolist()
+
+        results = []
+        for i, (base_score, final_score) in enumerate(zip(np.asarray(base_scores).tolist(), final_scores.tolist())):
+            adjustments = {}
+            if shape_penalty[i]:
+                adjustments['shape_penalty'] = -0.05
+            if size_penalty[i]:
+                adjustments['size_penalty'] = -0.03
+            elif size_bonus[i]:
+                adjustments['size_bonus'] = 0.02
+
+            results.append({
+                'base_score': base_score,
+                'adjustments': adjustments,
+                'final_score': final_score,
+                'quality_category': categories[i],
+                'color_class': winning_classes[i]
+            })
+
+        return results
+
     @staticmethod
     def _get_quality_category(score: float) -> str:
         """
         Mapea el score (0-1) a una categoría de calidad
         """
-        if score >= QUALITY_THRESHOLDS['Specialty']:
-            return 'Specialty'
-        elif score >= QUALITY_THRESHOLDS['Premium']:
-            return 'Premium'
-        elif score >= QUALITY_THRESHOLDS['A']:
-            return 'A'
-        elif score >= QUALITY_THRESHOLDS['B']:
-            return 'B'
-        else:
-            return 'C'
+        return _CATEGORY_LIST[bisect.bisect_right(_THRESHOLD_LIST, score) - 1]
 
     @staticmethod
     def generate_batch_report(bean_assessments: List[Dict[str, Any]]) -> Dict[str, Any]:
@@ -87,35 +140,27 @@ class QualityGradingService:
             }
 
         total_beans = len(bean_assessments)
-        total_score = sum(assessment['final_score'] for assessment in bean_assessments)
-        average_score = total_score / total_beans
+        scores = np.fromiter(
+            (assessment['final_score'] for assessment in bean_assessments),
+            dtype=np.float64,
+            count=total_beans
+        )
+        average_score = float(scores.mean())
 
-        # Contar distribución por categoría
-        category_counts = {}
-        for assessment in bean_assessments:
-            category = assessment['quality_category']
-            category_counts[category] = category_counts.get(category, 0) + 1
+        # Contar distribución por categoría en una sola pasada
+        category_counts = Counter(assessment['quality_category'] for assessment in bean_assessments)
 
         # Encontrar categoría predominante
         predominant_category = max(category_counts.items(), key=lambda x: x[1])[0] if category_counts else 'N/A'
 
-        # Crear distribución con porcentajes
-        category_distribution = {}
+        # Crear distribución con porcentajes (todas las categorías existen, incluso con 0)
+        category_distribution = {category: {'count': 0, 'percentage': 0.0} for category in QUALITY_CATEGORIES}
         for category, count in category_counts.items():
-            percentage = (count / total_beans) * 100
             category_distribution[category] = {
                 'count': count,
-                'percentage': percentage
+                'percentage': (count / total_beans) * 100
             }
 
-        # Asegurar que todas las categorías existan (incluso con 0)
-        for category in ['Specialty', 'Premium', 'A', 'B', 'C']:
-            if category not in category_distribution:
-                category_distribution[category] = {
-                    'count': 0,
-                    'percentage': 0.0
-                }
-
         # Calidad general del lote (en porcentaje 0-100)
         overall_batch_quality = average_score * 100
 
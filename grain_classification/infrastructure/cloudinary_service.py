@@ -1,10 +1,46 @@
+import asyncio
+import logging
 import cloudinary
 import cloudinary.uploader
 import cv2
 import numpy as np
+from concurrent.futures import ThreadPoolExecutor
 from io import BytesIO
+from itertools import repeat
 from shared.infrastructure.persistence.database.repositories.settings import settings
 
+logger = logging.getLogger(__name__)
+
+# Máximo de subidas simultáneas a Cloudinary (compartido por todas las sesiones del proceso)
+MAX_UPLOAD_WORKERS = 16
+
+# Pool de hilos compartido: evita crear y destruir hilos en cada sesión de clasificación
+_upload_executor = ThreadPoolExecutor(max_workers=MAX_UPLOAD_WORKERS, thread_name_prefix="cloudinary-upload")
+
+# Lado mayor máximo (px) de las imágenes de granos almacenadas
+MAX_GRAIN_IMAGE_SIDE = 500
+
+# Calidad JPEG de las imágenes de granos
+JPEG_QUALITY = 95
+
+# libjpeg-turbo (PyTurboJPEG) es opcional: si no está instalado se usa cv2.imencode
+try:
+    from turbojpeg import TurboJPEG, TJPF_BGR
+    _turbo_jpeg = TurboJPEG()
+except (ImportError, OSError, RuntimeError):
+    _turbo_jpeg = None
+
+
+def _encode_jpeg(image: np.ndarray) -> bytes:
+    """Codifica una imagen BGR a JPEG, con libjpeg-turbo si está disponible."""
+    if _turbo_jpeg is not None:
+        return _turbo_jpeg.encode(image, quality=JPEG_QUALITY, pixel_format=TJPF_BGR)
+
+    is_success, buffer = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY])
+    if not is_success:
+        raise ValueError("No se pudo codificar la imagen")
+    return buffer.tobytes()
+
 
 class CloudinaryService:
     """
@@ -37,17 +73,19 @@ class CloudinaryService:
         """
         try:
             # ⚠️ NO convertir a RGB aquí
-            # cv2.imencode() espera BGR y genera JPEG correctamente
+            # El codificador JPEG espera BGR y genera JPEG correctamente
             # La conversión BGR->RGB + imencode() causa inversión de colores
 
-            # Codificar la imagen directamente a formato JPEG en memoria
-            is_success, buffer = cv2.imencode(".jpg", grain_image,
-                                              [cv2.IMWRITE_JPEG_QUALITY, 95])
-            if not is_success:
-                raise ValueError("No se pudo codificar la imagen")
+            # Reducir localmente antes de codificar para no subir la imagen a
+            # resolución completa (mantiene la proporción, solo reduce)
+            height, width = grain_image.shape[:2]
+            scale = MAX_GRAIN_IMAGE_SIDE / max(height, width)
+            if scale < 1:
+                grain_image = cv2.resize(grain_image, None, fx=scale, fy=scale,
+                                         interpolation=cv2.INTER_AREA)
 
-            # Convertir a bytes
-            image_bytes = BytesIO(buffer.tobytes())
+            # Codificar la imagen directamente a formato JPEG en memoria
+            image_bytes = BytesIO(_encode_jpeg(grain_image))
 
             # Generar un public_id único
             public_id = f"grains/{session_id}/grain_{grain_index}"
@@ -60,7 +98,6 @@ class CloudinaryService:
                 resource_type="image",
                 overwrite=True,
                 transformation=[
-                    {'width': 500, 'height': 500, 'crop': 'limit'},
                     {'quality': 'auto:good'}
                 ]
             )
@@ -71,13 +108,44 @@ class CloudinaryService:
             }
 
         except Exception as e:
-            print(f"Error al subir imagen a Cloudinary: {e}")
+            logger.error("Error al subir imagen a Cloudinary: %s", e)
             return {
                 'url': None,
                 'public_id': None,
                 'error': str(e)
             }
 
+    def upload_grain_images_bulk(self, grain_images: list[np.ndarray], session_id: str) -> list[dict]:
+        """
+        Sube las imágenes de todos los granos de una sesión en paralelo.
+
+        Cada hilo codifica (el codificador JPEG libera el GIL) y sube su imagen, de modo que
+        el tiempo total se acerca al de una sola subida en lugar de N subidas seguidas.
+
+        Returns:
+            Lista de resultados de upload_grain_image, en el mismo orden de entrada
+        """
+        if not grain_images:
+            return []
+
+        return list(_upload_executor.map(
+            self.upload_grain_image,
+            grain_images,
+            repeat(session_id),
+            range(len(grain_images))
+        ))
+
+    async def upload_many(self, grain_images: list[np.ndarray], session_id: str) -> list[dict]:
+        """
+        Versión asíncrona de upload_grain_images_bulk para código que corre en el event loop:
+        las subidas se ejecutan en el pool compartido sin bloquear el loop.
+        """
+        loop = asyncio.get_running_loop()
+        return list(await asyncio.gather(*(
+            loop.run_in_executor(_upload_executor, self.upload_grain_image, image, session_id, index)
+            for index, image in enumerate(grain_images)
+        )))
+
     @staticmethod
     def delete_grain_image(public_id: str) -> bool:
         """
@@ -87,5 +155,5 @@ class CloudinaryService:
             result = cloudinary.uploader.destroy(public_id)
             return result.get('result') == 'ok'
         except Exception as e:
-            print(f"Error al eliminar imagen de Cloudinary: {e}")
+            logger.error("Error al eliminar imagen de Cloudinary: %s", e)
             return False
\ No newline at end of file
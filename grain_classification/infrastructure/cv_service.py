@@ -1,6 +1,55 @@
+import io
+import logging
+import mmap
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import BinaryIO
+
 import cv2
 import numpy as np
 
+logger = logging.getLogger(__name__)
+
+# Numba es opcional: sin él se usa la versión equivalente en NumPy
+try:
+    from numba import njit, prange
+except ImportError:
+    njit = None
+
+# Kernels precalculados (se reutilizan en cada imagen y en cada grano)
+_MORPH_KERNEL = cv2.getStructuringElement(cv2.MORPH_RECT, (5, 5))
+_GAUSSIAN_KERNEL = cv2.getGaussianKernel(5, 0)
+
+_INV_255 = np.float32(1 / 255.0)
+
+# Pool de hilos compartido para extraer características: evita crear y destruir hilos
+# en cada imagen (las primitivas de OpenCV liberan el GIL, así que escala con los núcleos)
+_features_executor = ThreadPoolExecutor(max_workers=os.cpu_count() or 1, thread_name_prefix="cv-features")
+
+
+def _bgr_to_rgb_normalized_numpy(batch: np.ndarray) -> np.ndarray:
+    """Convierte un lote uint8 (N, H, W, 3) BGR a RGB float32 en [0, 1]."""
+    return np.multiply(batch[..., ::-1], _INV_255, dtype=np.float32)
+
+
+if njit is not None:
+    @njit(parallel=True, fastmath=True, cache=True, nogil=True)
+    def _bgr_to_rgb_normalized(batch: np.ndarray) -> np.ndarray:
+        """Igual que _bgr_to_rgb_normalized_numpy, en una sola pasada paralela por filas."""
+        n, height, width, _ = batch.shape
+        out = np.empty((n, height, width, 3), np.float32)
+        for row in prange(n * height):
+            i = row // height
+            y = row % height
+            for x in range(width):
+                out[i, y, x, 0] = batch[i, y, x, 2] * _INV_255
+                out[i, y, x, 1] = batch[i, y, x, 1] * _INV_255
+                out[i, y, x, 2] = batch[i, y, x, 0] * _INV_255
+        return out
+else:
+    _bgr_to_rgb_normalized = _bgr_to_rgb_normalized_numpy
+
 
 class CVService:
     """
@@ -13,6 +62,25 @@ class CVService:
         self.contrast_factor = contrast
         self.brightness_delta = brightness
 
+    def prepare_model_batch(self, beans_data: list[dict]) -> np.ndarray:
+        """
+        Construye el tensor de entrada de la CNN para todos los granos: redimensiona
+        cada recorte y convierte el lote completo de BGR uint8 a RGB float32 normalizado.
+
+        Returns:
+            Tensor float32 (N, alto, ancho, 3) con valores en [0, 1]
+        """
+        width, height = self.image_size
+        batch = np.empty((len(beans_data), height, width, 3), dtype=np.uint8)
+        for idx, bean_data in enumerate(beans_data):
+            cv2.resize(bean_data['image'], (width, height), dst=batch[idx])
+        return _bgr_to_rgb_normalized(batch)
+
+    def warmup(self) -> None:
+        """Compila el kernel de Numba al arrancar para no pagar la compilación en el primer request."""
+        width, height = self.image_size
+        _bgr_to_rgb_normalized(np.zeros((1, height, width, 3), dtype=np.uint8))
+
     @staticmethod
     def load_image_from_bytes(image_bytes: bytes) -> np.ndarray | None:
         """Carga una imagen desde bytes (ej. de un UploadFile de FastAPI)."""
@@ -23,34 +91,84 @@ class CVService:
                 raise ValueError("No se pudieron decodificar los bytes de la imagen")
             return img
         except Exception as e:
-            print(f"Error al cargar imagen desde bytes: {e}")
+            logger.warning("Error al cargar imagen desde bytes: %s", e)
             return None
 
+    @staticmethod
+    def load_image_from_file(file: BinaryIO) -> np.ndarray | None:
+        """
+        Carga una imagen desde un archivo (ej. UploadFile.file de FastAPI) sin copiarla a bytes.
+        Si el archivo ya está en disco se decodifica sobre un mmap; si está en memoria,
+        se lee una sola vez directamente en el buffer de NumPy.
+        """
+        try:
+            if CVService._is_on_disk(file):
+                with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    buffer = np.frombuffer(mapped, np.uint8)
+                    img = cv2.imdecode(buffer, cv2.IMREAD_COLOR)
+                    del buffer  # liberar la vista antes de cerrar el mmap
+            else:
+                size = file.seek(0, io.SEEK_END)
+                file.seek(0)
+                buffer = np.empty(size, np.uint8)
+                file.readinto(buffer)
+                img = cv2.imdecode(buffer, cv2.IMREAD_COLOR)
+
+            if img is None:
+                raise ValueError("No se pudo decodificar la imagen del archivo")
+            return img
+        except Exception as e:
+            logger.warning("Error al cargar imagen desde archivo: %s", e)
+            return None
+
+    @staticmethod
+    def _is_on_disk(file: BinaryIO) -> bool:
+        """Indica si el archivo tiene un descriptor real en disco (apto para mmap)."""
+        # SpooledTemporaryFile mantiene los archivos pequeños en memoria y fileno() forzaría su volcado
+        if isinstance(file, tempfile.SpooledTemporaryFile):
+            return file._rolled
+        try:
+            file.fileno()
+            return True
+        except (AttributeError, OSError, io.UnsupportedOperation):
+            return False
+
     @staticmethod
     def segment_beans(image: np.ndarray) -> list[dict]:
         """
         Segmenta granos individuales en la imagen.
         (Lógica de image_processor.py)
         """
+        # UMat habilita el backend OpenCL (T-API) de OpenCV: gris, umbral y morfología
+        # se ejecutan en la GPU si está disponible y en CPU en caso contrario
+        uimage = cv2.UMat(image)
         if len(image.shape) == 3:
-            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+            ugray = cv2.cvtColor(uimage, cv2.COLOR_BGR2GRAY)
         else:
-            gray = image
+            ugray = uimage
 
         # Umbralización para separar granos del fondo
-        _, thresh = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+        _, uthresh = cv2.threshold(ugray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
 
-        # Limpieza morfológica
-        kernel = np.ones((5, 5), np.uint8)
-        cleaned = cv2.morphologyEx(thresh, cv2.MORPH_CLOSE, kernel, iterations=2)
+        # Limpieza morfológica (se descarga a memoria para el etiquetado)
+        cleaned = cv2.morphologyEx(uthresh, cv2.MORPH_CLOSE, _MORPH_KERNEL, iterations=2).get()
 
-        contours, _ = cv2.findContours(cleaned, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        # Etiquetado de componentes: áreas y bounding boxes de todas las regiones en una sola llamada
+        _, labels, stats, _ = cv2.connectedComponentsWithStats(cleaned, connectivity=8)
+
+        # Filtrar ruido con NumPy (la etiqueta 0 es el fondo)
+        kept_labels = np.flatnonzero(stats[1:, cv2.CC_STAT_AREA] > 500) + 1
 
         beans_data = []
-        for c in contours:
-            area = cv2.contourArea(c)
-            if area > 500:  # Filtrar ruido
-                x, y, w, h = cv2.boundingRect(c)
+        for label in kept_labels:
+            x, y, w, h = stats[label, :4]
+
+            # El contorno solo se calcula para las regiones conservadas, dentro de su bounding box
+            mask = (labels[y:y + h, x:x + w] == label).astype(np.uint8)
+            contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE, offset=(int(x), int(y)))
+            c = max(contours, key=cv2.contourArea)
+
+            if cv2.contourArea(c) > 500:  # Filtrar ruido
                 bean_image = image[y:y + h, x:x + w]
                 beans_data.append({'image': bean_image, 'contour': c})
         return beans_data
@@ -78,12 +196,33 @@ class CVService:
         else:
             gray = image
 
-        blurred = cv2.GaussianBlur(gray, (5, 5), 0)
+        # Desenfoque gaussiano 5x5 separable con el kernel precalculado
+        blurred = cv2.sepFilter2D(gray, -1, _GAUSSIAN_KERNEL, _GAUSSIAN_KERNEL)
         edges = cv2.Canny(blurred, 50, 150)
-        edge_density = np.sum(edges) / (255 * edges.size) if edges.size > 0 else 0
+        # Canny solo produce 0 o 255: contar píxeles no nulos equivale a sum / 255
+        edge_density = cv2.countNonZero(edges) / edges.size if edges.size > 0 else 0
 
         # Umbral simple: si más del 5% son bordes, asumimos grietas
-        has_cracks_bool = edge_density > 0.05
-        features['has_cracks'] = str(has_cracks_bool)
+        features['has_cracks'] = bool(edge_density > 0.05)
 
-        return features
\ No newline at end of file
+        return features
+
+    @staticmethod
+    def extract_all_features_bulk(beans_data: list[dict]) -> list[dict]:
+        """
+        Extrae las características de todos los granos en paralelo.
+
+        extract_all_features solo ejecuta primitivas de OpenCV que liberan el GIL,
+        por lo que el pool compartido escala con los núcleos disponibles.
+
+        Returns:
+            Lista de características por grano, en el mismo orden de entrada
+        """
+        if not beans_data:
+            return []
+
+        return list(_features_executor.map(
+            CVService.extract_all_features,
+            [bean_data['image'] for bean_data in beans_data],
+            [bean_data['contour'] for bean_data in beans_data]
+        ))
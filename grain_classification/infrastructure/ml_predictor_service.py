@@ -1,10 +1,121 @@
+import logging
 import numpy as np
-from tensorflow import keras
 import os
 import requests
+import shutil
+import threading
 import time
+from grain_classification.infrastructure.prediction_batcher import PredictionBatcher
 from shared.infrastructure.persistence.database.repositories.settings import settings
 
+logger = logging.getLogger(__name__)
+
+# Tamaño de bloque para copiar la descarga del modelo a disco
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+
+# Intervalo de registro del progreso de descarga
+DOWNLOAD_PROGRESS_STEP = 50 * 1024 * 1024
+
+# Extensiones de los modelos exportados (ver model_conversion.py)
+TFLITE_EXTENSION = '.tflite'
+ONNX_EXTENSION = '.onnx'
+
+
+def _inference_threads() -> int:
+    """Cantidad de hilos para inferencia (ML_INTRA_OP_THREADS o todos los núcleos)."""
+    return settings.ML_INTRA_OP_THREADS or os.cpu_count()
+
+
+def _configure_tf_runtime():
+    """
+    Ajusta los pools de hilos de TensorFlow. Debe ejecutarse antes de inicializar el
+    runtime; si ya fue inicializado, se conserva la configuración existente.
+    """
+    import tensorflow as tf
+
+    try:
+        tf.config.threading.set_intra_op_parallelism_threads(_inference_threads())
+        tf.config.threading.set_inter_op_parallelism_threads(settings.ML_INTER_OP_THREADS)
+    except RuntimeError as e:
+        logger.warning("No se pudo ajustar los hilos de TensorFlow: %s", e)
+
+
+def _xla_batch_buckets(max_batch_size: int) -> list[int]:
+    """
+    Tamaños de lote con los que se invoca el modelo compilado con XLA (potencias de 2
+    hasta max_batch_size). XLA recompila por cada forma de entrada distinta, así que los
+    lotes se rellenan hasta el bucket siguiente y solo se compilan estas formas.
+    """
+    buckets = []
+    size = 1
+    while size < max_batch_size:
+        buckets.append(size)
+        size *= 2
+    buckets.append(max_batch_size)
+    return buckets
+
+
+def _compile_keras_predict(model):
+    """
+    Envuelve la inferencia de Keras en un tf.function (compilado con XLA si ML_XLA_JIT)
+    para fusionar conv + bias + activación en un solo kernel.
+    """
+    import tensorflow as tf
+
+    @tf.function(jit_compile=settings.ML_XLA_JIT, reduce_retracing=True)
+    def predict(input_tensor):
+        return model(input_tensor, training=False)
+
+    return predict
+
+
+def _create_tflite_interpreter(model_path: str):
+    """
+    Crea el intérprete TFLite, priorizando el paquete liviano tflite_runtime
+    y usando tf.lite como respaldo.
+    """
+    try:
+        from tflite_runtime.interpreter import Interpreter
+    except ImportError:
+        import tensorflow as tf
+        Interpreter = tf.lite.Interpreter
+
+    interpreter = Interpreter(model_path=model_path, num_threads=_inference_threads())
+    interpreter.allocate_tensors()
+    return interpreter
+
+
+def _create_onnx_session(model_path: str):
+    """Crea la sesión de ONNX Runtime en CPU con todas las optimizaciones de grafo."""
+    import onnxruntime as ort
+
+    options = ort.SessionOptions()
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    options.intra_op_num_threads = _inference_threads()
+    return ort.InferenceSession(model_path, sess_options=options, providers=['CPUExecutionProvider'])
+
+
+class _DownloadProgressReader:
+    """
+    Envuelve el stream de descarga y registra el progreso cada DOWNLOAD_PROGRESS_STEP bytes.
+    """
+
+    def __init__(self, raw, total_size: int):
+        self._raw = raw
+        self.total_size = total_size
+        self.downloaded = 0
+        self._next_log = DOWNLOAD_PROGRESS_STEP
+
+    def read(self, size: int = -1) -> bytes:
+        chunk = self._raw.read(size)
+        self.downloaded += len(chunk)
+        if self.downloaded >= self._next_log:
+            self._next_log += DOWNLOAD_PROGRESS_STEP
+            progress = (self.downloaded / self.total_size * 100) if self.total_size > 0 else 0
+            logger.info("Progreso: %.1f MB / %.1f MB (%.1f%%)",
+                        self.downloaded / (1024 ** 2), self.total_size / (1024 ** 2), progress)
+        return chunk
+
 
 class MLPredictorService:
     """
@@ -16,7 +127,24 @@ class MLPredictorService:
     def __init__(self, model_path: str, color_classes: list[str]):
         self.model_path = model_path
         self.color_classes = color_classes
+        self.is_tflite = model_path.endswith(TFLITE_EXTENSION)
+        self.is_onnx = model_path.endswith(ONNX_EXTENSION)
+        self._onnx_input_name = None
+        # El intérprete TFLite no es thread-safe: se serializan las invocaciones
+        self._tflite_lock = threading.Lock()
+        self._tflite_input = None
+        self._tflite_output = None
+        # Forma de entrada con la que están reservados los tensores del intérprete
+        self._tflite_shape = None
+        self._keras_predict = None
+        self._xla_buckets = _xla_batch_buckets(max(1, settings.ML_MAX_BATCH_SIZE))
         self.cnn_model = self._load_model()
+        # Agrupa las predicciones de requests concurrentes en una sola pasada del modelo
+        self._batcher = PredictionBatcher(
+            self.predict_color_percentages_batch,
+            max_batch_size=settings.ML_MAX_BATCH_SIZE,
+            max_wait_ms=settings.ML_BATCH_WAIT_MS
+        )
 
     def _download_model_from_blob(self) -> bool:
         """Descarga el modelo de ml desde Azure Blob Storage."""
@@ -25,49 +153,139 @@ class MLPredictorService:
 
         # Verificar que no sea el valor por defecto
         if not model_blob_url or model_blob_url == "https://your-blob-storage-url-here":
-            print("ERROR: MODEL_BLOB_URL no está configurada correctamente.")
-            print("Valor actual:", model_blob_url)
-            print("Verifica tu archivo .env o variables de entorno")
+            logger.error("MODEL_BLOB_URL no está configurada correctamente (valor actual: %s). "
+                         "Verifica tu archivo .env o variables de entorno", model_blob_url)
             return False
 
-        print(f"Descargando modelo desde Blob Storage...")
-        print(f"URL: {model_blob_url.split('?')[0] if '?' in model_blob_url else model_blob_url}")
+        logger.info("Descargando modelo desde Blob Storage: %s", model_blob_url.split('?')[0])
 
         try:
             # Crear el directorio si no existe
             os.makedirs(os.path.dirname(self.model_path), exist_ok=True)
 
             # Descargar con streaming para archivos grandes
-            response = requests.get(model_blob_url, stream=True, timeout=300)
-            response.raise_for_status()
-
-            # Guardar el archivo en chunks
-            total_size = int(response.headers.get('content-length', 0))
-            downloaded = 0
-
-            print(f"Tamaño total: {total_size / (1024 ** 2):.1f} MB")
-
-            with open(self.model_path, 'wb') as f:
-                for chunk in response.iter_content(chunk_size=8192):
-                    if chunk:
-                        f.write(chunk)
-                        downloaded += len(chunk)
-                        # Log progreso cada 50MB
-                        if downloaded % (50 * 1024 * 1024) == 0:
-                            progress = (downloaded / total_size * 100) if total_size > 0 else 0
-                            print(
-                                f"  Progreso: {downloaded / (1024 ** 2):.1f} MB / {total_size / (1024 ** 2):.1f} MB ({progress:.1f}%)")
-
-            print(f"✅ Descarga completada: {downloaded / (1024 ** 2):.1f} MB")
+            with requests.get(model_blob_url, stream=True, timeout=300) as response:
+                response.raise_for_status()
+                response.raw.decode_content = True
+
+                total_size = int(response.headers.get('content-length', 0))
+                logger.info("Tamaño total: %.1f MB", total_size / (1024 ** 2))
+
+                # Copiar a disco en bloques de 1 MB (bucle de copia en C)
+                reader = _DownloadProgressReader(response.raw, total_size)
+                with open(self.model_path, 'wb') as f:
+                    shutil.copyfileobj(reader, f, length=DOWNLOAD_CHUNK_SIZE)
+
+            logger.info("Descarga completada: %.1f MB", reader.downloaded / (1024 ** 2))
             return True
 
         except requests.exceptions.RequestException as e:
-            print(f"❌ ERROR DE RED al descargar desde Blob Storage: {e}")
+            logger.error("Error de red al descargar desde Blob Storage: %s", e)
             return False
         except Exception as e:
-            print(f"❌ ERROR al guardar modelo descargado: {e}")
+            logger.error("Error al guardar modelo descargado: %s", e)
             return False
 
+    def _read_model_file(self):
+        """Lee el modelo desde disco según su formato (.h5 de Keras, .tflite cuantizado u .onnx)."""
+        if self.is_onnx:
+            session = _create_onnx_session(self.model_path)
+            self._onnx_input_name = session.get_inputs()[0].name
+            return session
+
+        if not self.is_tflite:
+            # TensorFlow se importa recién aquí: los workers que no clasifican no pagan su carga
+            from tensorflow import keras
+
+            _configure_tf_runtime()
+            model = keras.models.load_model(self.model_path)
+            self._keras_predict = _compile_keras_predict(model)
+            return model
+
+        interpreter = _create_tflite_interpreter(self.model_path)
+        # Cachear los detalles de entrada/salida una sola vez
+        self._tflite_input = interpreter.get_input_details()[0]
+        self._tflite_output = interpreter.get_output_details()[0]
+        self._tflite_shape = tuple(self._tflite_input['shape'])
+        return interpreter
+
+    def _run_tflite(self, input_tensor: np.ndarray) -> np.ndarray:
+        """Ejecuta el intérprete TFLite sobre un lote float32 (N, 224, 224, 3)."""
+        input_details = self._tflite_input
+        output_details = self._tflite_output
+
+        # Cuantizar la entrada si el modelo espera int8/uint8 (saturando al rango del tipo
+        # en vez de desbordar)
+        if input_details['dtype'] != np.float32:
+            scale, zero_point = input_details['quantization']
+            limits = np.iinfo(input_details['dtype'])
+            input_tensor = np.clip(
+                np.round(input_tensor / scale + zero_point), limits.min, limits.max
+            ).astype(input_details['dtype'])
+
+        with self._tflite_lock:
+            if self._tflite_shape != input_tensor.shape:
+                self.cnn_model.resize_tensor_input(input_details['index'], list(input_tensor.shape))
+                self.cnn_model.allocate_tensors()
+                self._tflite_shape = input_tensor.shape
+
+            self.cnn_model.set_tensor(input_details['index'], input_tensor)
+            self.cnn_model.invoke()
+            output = self.cnn_model.get_tensor(output_details['index'])
+
+        # Decuantizar la salida a probabilidades float32
+        if output_details['dtype'] != np.float32:
+            scale, zero_point = output_details['quantization']
+            output = (output.astype(np.float32) - zero_point) * scale
+
+        return output
+
+    def _run_model(self, input_tensor: np.ndarray) -> np.ndarray:
+        """Ejecuta el modelo cargado (Keras, TFLite u ONNX) y devuelve las probabilidades por clase."""
+        if self.is_onnx:
+            return self.cnn_model.run(None, {self._onnx_input_name: input_tensor})[0]
+        if self.is_tflite:
+            return self._run_tflite(input_tensor)
+        if settings.ML_XLA_JIT:
+            return self._run_keras_bucketed(input_tensor)
+        return self._keras_predict(input_tensor).numpy()
+
+    def _run_keras_bucketed(self, input_tensor: np.ndarray) -> np.ndarray:
+        """
+        Ejecuta el modelo Keras compilado con XLA solo con los tamaños de lote de
+        _xla_buckets: divide las entradas mayores al bucket máximo y rellena con ceros
+        cada parte hasta su bucket, para no recompilar con cada N nuevo.
+        """
+        max_bucket = self._xla_buckets[-1]
+        outputs = []
+        for start in range(0, len(input_tensor), max_bucket):
+            chunk = input_tensor[start:start + max_bucket]
+            count = len(chunk)
+            bucket = next(size for size in self._xla_buckets if size >= count)
+            if bucket != count:
+                padding = np.zeros((bucket - count, *chunk.shape[1:]), dtype=chunk.dtype)
+                chunk = np.concatenate((chunk, padding))
+            outputs.append(self._keras_predict(chunk).numpy()[:count])
+
+        return outputs[0] if len(outputs) == 1 else np.concatenate(outputs)
+
+    def warmup(self, image_size: tuple[int, int]) -> None:
+        """
+        Ejecuta una predicción sobre imágenes vacías al arrancar, para que la compilación
+        del grafo y la reserva de buffers no ocurran en el primer request. Con XLA se
+        compila cada bucket de tamaño de lote.
+
+        Args:
+            image_size: (ancho, alto) de entrada del modelo
+        """
+        if self.cnn_model is None:
+            return
+
+        width, height = image_size
+        keras_xla = settings.ML_XLA_JIT and not (self.is_tflite or self.is_onnx)
+        for batch_size in (self._xla_buckets if keras_xla else (1,)):
+            self._run_model(np.zeros((batch_size, height, width, 3), dtype=np.float32))
+
     def _load_model(self):
         """
         Carga el modelo CNN con estrategia de fallback:
@@ -78,28 +296,26 @@ class MLPredictorService:
         # ESTRATEGIA 1: Intentar carga local primero (lo más común)
         if os.path.exists(self.model_path):
             try:
-                print(f"📂 Cargando modelo desde: {self.model_path}")
-                model = keras.models.load_model(self.model_path)
+                logger.info("Cargando modelo desde: %s", self.model_path)
+                model = self._read_model_file()
                 file_size = os.path.getsize(self.model_path) / (1024 ** 2)
-                print(f"Modelo CNN cargado desde disco ({file_size:.1f} MB)")
+                logger.info("Modelo CNN cargado desde disco (%.1f MB)", file_size)
                 return model
             except Exception as e:
-                print(f"Falló carga local del modelo: {e}")
-                print("Intentando descarga desde Blob Storage...")
+                logger.warning("Falló carga local del modelo: %s. Intentando descarga desde Blob Storage...", e)
                 # Eliminar archivo corrupto
                 try:
                     os.remove(self.model_path)
-                    print("Archivo corrupto eliminado")
+                    logger.info("Archivo corrupto eliminado")
                 except Exception as remove_error:
-                    print(f"No se pudo eliminar archivo corrupto: {remove_error}")
+                    logger.warning("No se pudo eliminar archivo corrupto: %s", remove_error)
 
         # ESTRATEGIA 2: Descargar desde Blob Storage (solo si no existe localmente)
-        print(f"📥 Modelo no encontrado localmente. Descargando desde Blob Storage...")
+        logger.info("Modelo no encontrado localmente. Descargando desde Blob Storage...")
 
         if not self._download_model_from_blob():
-            print("❌ CRÍTICO: No se pudo descargar el modelo desde Blob Storage")
-            print(f"   Ruta esperada: {self.model_path}")
-            print(f"   Configuración actual: MODEL_BLOB_URL = {settings.MODEL_BLOB_URL[:50]}...")
+            logger.critical("No se pudo descargar el modelo desde Blob Storage (ruta esperada: %s, MODEL_BLOB_URL = %s...)",
+                            self.model_path, settings.MODEL_BLOB_URL[:50])
             return None
 
         # Esperar un momento para asegurar que el archivo esté completamente escrito
@@ -107,43 +323,92 @@ class MLPredictorService:
 
         # ESTRATEGIA 3: Intentar carga después de descarga
         try:
-            print(f"📂 Cargando modelo descargado...")
-            model = keras.models.load_model(self.model_path)
+            logger.info("Cargando modelo descargado...")
+            model = self._read_model_file()
             file_size = os.path.getsize(self.model_path) / (1024 ** 2)
-            print(f"✅ Modelo CNN cargado exitosamente después de descarga ({file_size:.1f} MB)")
+            logger.info("Modelo CNN cargado exitosamente después de descarga (%.1f MB)", file_size)
             return model
         except Exception as e:
-            print(f"❌ CRÍTICO: Error al cargar modelo después de descarga: {e}")
+            logger.critical("Error al cargar modelo después de descarga: %s", e)
             return None
 
+    def _to_percentages(self, raw_predictions: np.ndarray) -> list[dict]:
+        """
+        Redondea las probabilidades (N, C) a 3 decimales y normaliza cada fila a 100%.
+        """
+        rounded = np.round(raw_predictions.astype(np.float64), 3)
+        totals = rounded.sum(axis=1, keepdims=True)
+        percentages = np.divide(rounded * 100, totals, out=rounded.copy(), where=totals > 0)
+
+        return [dict(zip(self.color_classes, row)) for row in percentages.tolist()]
+
     def predict_color_percentages(self, processed_image: np.ndarray) -> dict | None:
         """
         Predice los porcentajes de confianza para cada clase de color.
         """
         if self.cnn_model is None:
-            print("❌ Modelo no disponible para predicción")
+            logger.error("Modelo no disponible para predicción")
             return None
 
         try:
-            # Normalizar imagen
-            normalized_image = processed_image / 255.0
-            input_tensor = np.expand_dims(normalized_image, axis=0)
+            # Normalizar imagen directamente en float32 (evita el upcast a float64)
+            normalized_image = np.multiply(processed_image, np.float32(1 / 255.0), dtype=np.float32)
+            input_tensor = normalized_image[None, ...]
 
             # Predicción
-            raw_predictions = self.cnn_model.predict(input_tensor, verbose=0)[0]
+            raw_predictions = self._run_model(input_tensor)
 
-            # Convertir a diccionario
-            predictions = {}
-            for i, color_class in enumerate(self.color_classes):
-                predictions[color_class] = round(raw_predictions[i].item(), 3)
+            return self._to_percentages(raw_predictions)[0]
 
-            # Normalizar a 100%
-            total_prob = sum(predictions.values())
-            if total_prob > 0:
-                predictions = {k: (v / total_prob) * 100 for k, v in predictions.items()}
+        except Exception as e:
+            logger.exception("Error durante predicción CNN: %s", e)
+            return None
+
+    def predict_color_percentages_batch(self, images: np.ndarray) -> list[dict] | None:
+        """
+        Predice los porcentajes de color para un lote de granos en una sola llamada al modelo.
+
+        Args:
+            images: Tensor (N, 224, 224, 3) con las imágenes RGB ya redimensionadas,
+                en uint8 o ya normalizadas en float32 (CVService.prepare_model_batch)
 
-            return predictions
+        Returns:
+            Lista con un diccionario de porcentajes por grano, en el mismo orden de entrada
+        """
+        if self.cnn_model is None:
+            logger.error("Modelo no disponible para predicción")
+            return None
+
+        if len(images) == 0:
+            return []
+
+        try:
+            # Normalizar todo el lote de una sola vez en float32 (si aún no lo está)
+            if images.dtype == np.float32:
+                input_tensor = images
+            else:
+                input_tensor = np.multiply(images, np.float32(1 / 255.0), dtype=np.float32)
+
+            # Una sola pasada por el modelo para los N granos
+            raw_predictions = self._run_model(input_tensor)
+
+            return self._to_percentages(raw_predictions)
 
         except Exception as e:
-            print(f"❌ Error durante predicción CNN: {e}")
-            return None
\ No newline at end of file
+            logger.exception("Error durante predicción CNN por lote: %s", e)
+            return None
+
+    def predict_color_percentages_coalesced(self, images: np.ndarray) -> list[dict] | None:
+        """
+        Igual que predict_color_percentages_batch, pero compartiendo la llamada al modelo
+        con los requests concurrentes (micro-batching). Bloquea hasta tener el resultado.
+        """
+        if self.cnn_model is None:
+            logger.error("Modelo no disponible para predicción")
+            return None
+
+        # Normalizar antes de encolar para que todos los lotes agrupados sean float32
+        if images.dtype != np.float32:
+            images = np.multiply(images, np.float32(1 / 255.0), dtype=np.float32)
+
+        return self._batcher.submit(images)
@@ -0,0 +1,180 @@
+"""
+Conversión offline del modelo CNN de Keras (.h5) a los formatos de inferencia
+soportados por MLPredictorService:
+
+- TFLite con cuantización int8 (requiere imágenes de calibración)
+- ONNX para ONNX Runtime (requiere tf2onnx, solo en el entorno de build)
+- ONNX int8, cuantizando un .onnx existente (estático con calibración o dinámico)
+
+El formato se elige por la extensión de los archivos de entrada y salida.
+Con --validate se compara la clase ganadora de ambos modelos sobre un conjunto
+de imágenes reservado antes de cambiar MODEL_PATH al modelo nuevo.
+
+Uso:
+    python -m grain_classification.infrastructure.model_conversion \\
+        grain_classification/infrastructure/ml_models/defect_detector.h5 \\
+        grain_classification/infrastructure/ml_models/defect_detector_int8.tflite \\
+        --samples ruta/a/imagenes_de_granos
+
+    python -m grain_classification.infrastructure.model_conversion \\
+        grain_classification/infrastructure/ml_models/defect_detector.h5 \\
+        grain_classification/infrastructure/ml_models/defect_detector.onnx
+
+    python -m grain_classification.infrastructure.model_conversion \\
+        grain_classification/infrastructure/ml_models/defect_detector.onnx \\
+        grain_classification/infrastructure/ml_models/defect_detector.int8.onnx \\
+        --samples ruta/a/imagenes_de_granos --validate ruta/a/imagenes_reservadas
+"""
+import argparse
+import os
+
+import cv2
+import numpy as np
+
+# Tamaño de entrada esperado por la CNN
+MODEL_INPUT_SIZE = (224, 224)
+
+# Cantidad máxima de imágenes usadas para calibrar la cuantización
+MAX_CALIBRATION_SAMPLES = 200
+
+
+def _representative_dataset(samples_dir: str):
+    """
+    Genera imágenes de granos reales para calibrar los rangos de activación int8.
+    Aplica el mismo preprocesamiento que el servicio de clasificación.
+    """
+    file_names = sorted(os.listdir(samples_dir))[:MAX_CALIBRATION_SAMPLES]
+
+    def generator():
+        for file_name in file_names:
+            image = cv2.imread(os.path.join(samples_dir, file_name))
+            if image is None:
+                continue
+            image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+            image = cv2.resize(image, MODEL_INPUT_SIZE)
+            yield [np.multiply(image[None, ...], 1 / 255.0, dtype=np.float32)]
+
+    return generator
+
+
+def convert_to_tflite_int8(keras_model_path: str, output_path: str, samples_dir: str) -> int:
+    """
+    Convierte el modelo Keras a TFLite con cuantización post-entrenamiento int8.
+
+    Returns:
+        Tamaño en bytes del modelo generado
+    """
+    import tensorflow as tf
+
+    model = tf.keras.models.load_model(keras_model_path)
+
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    converter.representative_dataset = _representative_dataset(samples_dir)
+    converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+    converter.inference_input_type = tf.uint8
+    converter.inference_output_type = tf.uint8
+
+    tflite_model = converter.convert()
+
+    with open(output_path, 'wb') as f:
+        f.write(tflite_model)
+
+    return len(tflite_model)
+
+
+def convert_to_onnx(keras_model_path: str, output_path: str) -> int:
+    """
+    Exporta el modelo Keras a ONNX con un batch dinámico.
+
+    Returns:
+        Tamaño en bytes del modelo generado
+    """
+    import tensorflow as tf
+    import tf2onnx
+
+    model = tf.keras.models.load_model(keras_model_path)
+    input_signature = [tf.TensorSpec((None, *MODEL_INPUT_SIZE, 3), tf.float32, name='input')]
+    tf2onnx.convert.from_keras(model, input_signature=input_signature, output_path=output_path)
+
+    return os.path.getsize(output_path)
+
+
+def quantize_onnx_int8(onnx_model_path: str, output_path: str, samples_dir: str | None = None) -> int:
+    """
+    Cuantiza un modelo ONNX a int8. Con imágenes de calibración usa cuantización
+    estática (activaciones y pesos, más precisa); sin ellas, dinámica (solo pesos).
+
+    Returns:
+        Tamaño en bytes del modelo generado
+    """
+    import onnxruntime as ort
+    from onnxruntime.quantization import (CalibrationDataReader, QuantFormat, QuantType,
+                                          quantize_dynamic, quantize_static)
+
+    if samples_dir is None:
+        quantize_dynamic(onnx_model_path, output_path, weight_type=QuantType.QInt8)
+        return os.path.getsize(output_path)
+
+    input_name = ort.InferenceSession(onnx_model_path, providers=['CPUExecutionProvider']).get_inputs()[0].name
+
+    class GrainCalibrationReader(CalibrationDataReader):
+        def __init__(self):
+            self._samples = _representative_dataset(samples_dir)()
+
+        def get_next(self):
+            sample = next(self._samples, None)
+            return None if sample is None else {input_name: sample[0]}
+
+    quantize_static(
+        onnx_model_path,
+        output_path,
+        GrainCalibrationReader(),
+        quant_format=QuantFormat.QDQ,
+        activation_type=QuantType.QUInt8,
+        weight_type=QuantType.QInt8,
+        per_channel=True
+    )
+    return os.path.getsize(output_path)
+
+
+def top1_agreement(reference_model_path: str, candidate_model_path: str, samples_dir: str) -> float:
+    """
+    Porcentaje de imágenes en las que ambos modelos predicen la misma clase de color.
+    """
+    from grain_classification.domain.model.valueobjetcs.quality_models import CNN_COLOR_CLASSES
+    from grain_classification.infrastructure.ml_predictor_service import MLPredictorService
+
+    batch = np.concatenate([sample[0] for sample in _representative_dataset(samples_dir)()])
+    reference = MLPredictorService(reference_model_path, CNN_COLOR_CLASSES).predict_color_percentages_batch(batch)
+    candidate = MLPredictorService(candidate_model_path, CNN_COLOR_CLASSES).predict_color_percentages_batch(batch)
+
+    matches = sum(
+        max(ref, key=ref.get) == max(cand, key=cand.get)
+        for ref, cand in zip(reference, candidate)
+    )
+    return matches / len(batch) * 100
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convierte el modelo CNN a TFLite int8, ONNX u ONNX int8")
+    parser.add_argument("model_path", help="Modelo de entrada (.h5, o .onnx para cuantizar)")
+    parser.add_argument("output_path", help="Archivo de salida (.tflite u .onnx)")
+    parser.add_argument("--samples", help="Directorio con imágenes de granos para calibración")
+    parser.add_argument("--validate", help="Directorio con imágenes reservadas para comparar ambos modelos")
+    args = parser.parse_args()
+
+    if args.model_path.endswith('.onnx'):
+        size = quantize_onnx_int8(args.model_path, args.output_path, args.samples)
+    elif args.output_path.endswith('.onnx'):
+        size = convert_to_onnx(args.model_path, args.output_path)
+    else:
+        if not args.samples:
+            parser.error("--samples es obligatorio para la conversión a TFLite")
+        size = convert_to_tflite_int8(args.model_path, args.output_path, args.samples)
+
+    print(f"✅ Modelo generado: {args.output_path} ({size / (1024 ** 2):.1f} MB)")
+
+    if args.validate:
+        agreement = top1_agreement(args.model_path, args.output_path, args.validate)
+        print(f"Coincidencia de clase ganadora: {agreement:.1f}%")
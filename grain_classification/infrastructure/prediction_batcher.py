@@ -0,0 +1,93 @@
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class PredictionBatcher:
+    """
+    Micro-batching de inferencia: agrupa los lotes de granos de requests concurrentes
+    en una sola llamada al modelo (hasta max_batch_size granos o max_wait_ms de espera,
+    lo que ocurra primero) y devuelve a cada request solo sus resultados.
+    """
+
+    def __init__(self, predict_batch: Callable[[np.ndarray], list[dict] | None],
+                 max_batch_size: int = 64, max_wait_ms: float = 20.0):
+        self._predict_batch = predict_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue: queue.Queue[tuple[np.ndarray, Future]] = queue.Queue()
+        self._worker: threading.Thread | None = None
+        self._worker_lock = threading.Lock()
+
+    def submit(self, images: np.ndarray) -> list[dict] | None:
+        """
+        Encola el lote (N, H, W, 3) float32 de un request y espera su resultado.
+        Bloquea el hilo llamador; debe invocarse fuera del event loop.
+        """
+        if len(images) == 0:
+            return []
+
+        self._ensure_worker()
+        future: Future = Future()
+        self._queue.put((images, future))
+        return future.result()
+
+    def _ensure_worker(self) -> None:
+        """Inicia el hilo consumidor la primera vez que se usa."""
+        if self._worker is not None:
+            return
+        with self._worker_lock:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name="prediction-batcher", daemon=True)
+                self._worker.start()
+
+    def _collect(self) -> list[tuple[np.ndarray, Future]]:
+        """Toma el primer pedido (bloqueante) y suma otros hasta llenar el lote o agotar la espera."""
+        pending = [self._queue.get()]
+        total = len(pending[0][0])
+        deadline = time.monotonic() + self.max_wait
+
+        while total < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                images, future = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            pending.append((images, future))
+            total += len(images)
+
+        return pending
+
+    def _run(self) -> None:
+        while True:
+            pending = self._collect()
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Lote agrupado: %d requests, %d granos",
+                             len(pending), sum(len(images) for images, _ in pending))
+            try:
+                # Una sola pasada por el modelo para todos los requests agrupados
+                if len(pending) == 1:
+                    batch = pending[0][0]
+                else:
+                    batch = np.concatenate([images for images, _ in pending])
+                results = self._predict_batch(batch)
+            except Exception as e:
+                for _, future in pending:
+                    future.set_exception(e)
+                continue
+
+            # Repartir los resultados en el mismo orden en que llegaron los granos
+            start = 0
+            for images, future in pending:
+                end = start + len(images)
+                future.set_result(None if results is None else results[start:end])
+                start = end
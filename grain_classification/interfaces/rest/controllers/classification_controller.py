@@ -1,42 +1,75 @@
-from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, Form, Path, Body
+import logging
+from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, Form, Path, Body, FastAPI, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from datetime import datetime
 from pydantic import BaseModel, EmailStr
-from typing import List, Optional
+from typing import AsyncIterator, List, Optional
+from functools import lru_cache
+import orjson
 
+from coffee_lot_management.infrastructure.persistence.database.repositories.coffee_lot_repository import \
+    get_lot_number_cached
 from grain_classification.application.internal.classification_service import ClassificationApplicationService
 from grain_classification.application.internal.classification_query_service import ClassificationQueryService
+from grain_classification.domain.model.aggregates.classification_session import ClassificationSession
 from grain_classification.domain.model.valueobjetcs.quality_models import CNN_COLOR_CLASSES
 from grain_classification.domain.services.grading_service import QualityGradingService
 from grain_classification.infrastructure.cv_service import CVService
 from grain_classification.infrastructure.ml_predictor_service import MLPredictorService
 from grain_classification.infrastructure.cloudinary_service import CloudinaryService
-from shared.domain.database import get_db
+from shared.domain.database import get_db, get_async_ro_db
+from shared.infrastructure.persistence.database.repositories.settings import settings
+from shared.infrastructure.mail_queue import mail_queue
 from shared.infrastructure.notification_service import email_service
 
+logger = logging.getLogger(__name__)
+
 
 # --- Inyección de Dependencias ---
 
-def get_ml_predictor() -> MLPredictorService:
-    model_path = "grain_classification/infrastructure/ml_models/defect_detector.h5"
-    if not hasattr(get_ml_predictor, "singleton"):
-        get_ml_predictor.singleton = MLPredictorService(model_path, CNN_COLOR_CLASSES)
-    return get_ml_predictor.singleton
+@lru_cache(maxsize=1)
+def _create_ml_predictor() -> MLPredictorService:
+    # El modelo CNN se carga una sola vez por proceso
+    return MLPredictorService(settings.MODEL_PATH, CNN_COLOR_CLASSES)
+
+@lru_cache(maxsize=1)
+def _create_cv_service() -> CVService:
+    return CVService()
+
+@lru_cache(maxsize=1)
+def _create_grading_service() -> QualityGradingService:
+    return QualityGradingService()
 
-def get_cv_service() -> CVService:
-    if not hasattr(get_cv_service, "singleton"):
-        get_cv_service.singleton = CVService()
-    return get_cv_service.singleton
+@lru_cache(maxsize=1)
+def _create_cloudinary_service() -> CloudinaryService:
+    return CloudinaryService()
 
-def get_grading_service() -> QualityGradingService:
-    if not hasattr(get_grading_service, "singleton"):
-        get_grading_service.singleton = QualityGradingService()
-    return get_grading_service.singleton
+def preload_classification_services(app: FastAPI) -> None:
+    """
+    Construye los servicios de clasificación al arrancar la aplicación (incluida la
+    carga del modelo CNN) y los deja en app.state para que ningún request pague el arranque en frío.
+    """
+    app.state.ml_predictor = _create_ml_predictor()
+    app.state.cv_service = _create_cv_service()
+    app.state.cv_service.warmup()
+    app.state.ml_predictor.warmup(app.state.cv_service.image_size)
+    app.state.grading_service = _create_grading_service()
+    app.state.cloudinary_service = _create_cloudinary_service()
 
-def get_cloudinary_service() -> CloudinaryService:
-    if not hasattr(get_cloudinary_service, "singleton"):
-        get_cloudinary_service.singleton = CloudinaryService()
-    return get_cloudinary_service.singleton
+def get_ml_predictor(request: Request) -> MLPredictorService:
+    return request.app.state.ml_predictor
+
+def get_cv_service(request: Request) -> CVService:
+    return request.app.state.cv_service
+
+def get_grading_service(request: Request) -> QualityGradingService:
+    return request.app.state.grading_service
+
+def get_cloudinary_service(request: Request) -> CloudinaryService:
+    return request.app.state.cloudinary_service
 
 def get_classification_service(
         db: Session = Depends(get_db),
@@ -47,7 +80,7 @@ def get_classification_service(
 ) -> ClassificationApplicationService:
     return ClassificationApplicationService(db, cv, ml, grading, cloudinary)
 
-def get_query_service(db: Session = Depends(get_db)) -> ClassificationQueryService:
+def get_query_service(db: AsyncSession = Depends(get_async_ro_db)) -> ClassificationQueryService:
     return ClassificationQueryService(db)
 
 
@@ -95,6 +128,52 @@ class ClassificationSessionResponse(BaseModel):
         from_attributes = True
 
 
+def to_session_response(session: ClassificationSession) -> ClassificationSessionResponse:
+    """
+    Construye el DTO de sesión directamente desde las columnas (to_dict), sin que
+    Pydantic recorra los atributos del ORM. Los análisis deben venir precargados.
+    """
+    return ClassificationSessionResponse(
+        **session.to_dict(),
+        analyses=[GrainAnalysisResponse(**analysis.to_dict()) for analysis in session.analyses]
+    )
+
+
+# Campos expuestos por los DTOs (para las respuestas de lectura construidas sin Pydantic)
+_SESSION_FIELDS = tuple(name for name in ClassificationSessionResponse.model_fields if name != 'analyses')
+_ANALYSIS_FIELDS = tuple(GrainAnalysisResponse.model_fields)
+
+
+def _iter_session_json(session: ClassificationSession):
+    """
+    Serializa una sesión con los mismos campos que ClassificationSessionResponse,
+    emitiendo cada análisis como un fragmento JSON independiente.
+    """
+    head = orjson.dumps({name: getattr(session, name) for name in _SESSION_FIELDS})
+    yield head[:-1] + b',"analyses":['
+    for index, analysis in enumerate(session.analyses):
+        chunk = orjson.dumps({name: getattr(analysis, name) for name in _ANALYSIS_FIELDS})
+        yield chunk if index == 0 else b',' + chunk
+    yield b']}'
+
+
+async def iter_session_json(session: ClassificationSession) -> AsyncIterator[bytes]:
+    """Stream JSON de una sesión: el cliente recibe los primeros bytes sin esperar el payload completo."""
+    for chunk in _iter_session_json(session):
+        yield chunk
+
+
+async def iter_sessions_json(sessions: list[ClassificationSession]) -> AsyncIterator[bytes]:
+    """Stream JSON de una lista de sesiones, sin materializar la respuesta completa en memoria."""
+    yield b'['
+    for index, session in enumerate(sessions):
+        if index:
+            yield b','
+        for chunk in _iter_session_json(session):
+            yield chunk
+    yield b']'
+
+
 class AverageQualityResponse(BaseModel):
     """DTO para la calidad promedio"""
     coffee_lot_id: int
@@ -143,12 +222,14 @@ async def start_and_process_classification_session(
             detail="Formato de imagen no válido. Usar JPG o PNG."
         )
 
-    image_bytes = await image.read()
-
     try:
-        session = service.start_classification_session(
+        # Se decodifica directamente desde el archivo temporal del upload (sin copiarlo a bytes).
+        # El pipeline es bloqueante: corre en el threadpool para no detener el event loop y
+        # permitir que requests concurrentes compartan la pasada del modelo
+        session = await run_in_threadpool(
+            service.start_classification_session_stream,
             coffee_lot_id=coffee_lot_id,
-            image_bytes=image_bytes,
+            image_file=image.file,
             user_id=1,  # TODO: Reemplazar con ID de usuario autenticado
             user_email=user_email,
             send_email_notification=send_email_notification
@@ -160,12 +241,12 @@ async def start_and_process_classification_session(
                 detail=f"Clasificación fallida: {session.classification_result.get('error')}"
             )
 
-        return session
+        return to_session_response(session)
 
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        print(f"Error interno durante la clasificación: {e}")
+        logger.exception("Error interno durante la clasificación: %s", e)
         raise HTTPException(
             status_code=500,
             detail="Error interno del servidor de clasificación."
@@ -179,7 +260,7 @@ async def get_all_sessions(
     """
     Obtiene TODAS las sesiones de clasificación (sin filtro por lote).
     """
-    sessions = query_service.get_all_sessions()
+    sessions = await query_service.get_all_sessions()
 
     if not sessions:
         raise HTTPException(
@@ -187,7 +268,7 @@ async def get_all_sessions(
             detail="No se encontraron sesiones de clasificación"
         )
 
-    return sessions
+    return StreamingResponse(iter_sessions_json(sessions), media_type="application/json")
 
 
 @router.get("/sessions/coffee-lot/{coffee_lot_id}", response_model=List[ClassificationSessionResponse])
@@ -198,7 +279,7 @@ async def get_sessions_by_coffee_lot(
     """
     Obtiene todas las sesiones de clasificación de un lote de café específico.
     """
-    sessions = query_service.get_sessions_by_coffee_lot(coffee_lot_id)
+    sessions = await query_service.get_sessions_by_coffee_lot(coffee_lot_id)
 
     if not sessions:
         raise HTTPException(
@@ -206,7 +287,7 @@ async def get_sessions_by_coffee_lot(
             detail=f"No se encontraron sesiones para el lote {coffee_lot_id}"
         )
 
-    return sessions
+    return StreamingResponse(iter_sessions_json(sessions), media_type="application/json")
 
 
 @router.get("/overall-average-quality", response_model=OverallAverageQualityResponse)
@@ -217,7 +298,7 @@ async def get_overall_average_quality(
     Calcula la calidad promedio de todos los granos analizados (sin filtro por lote).
     Retorna un porcentaje en escala de 0-100%.
     """
-    result = query_service.get_overall_average_quality()
+    result = await query_service.get_overall_average_quality()
 
     if not result:
         raise HTTPException(
@@ -225,7 +306,7 @@ async def get_overall_average_quality(
             detail="No se encontraron análisis de granos"
         )
 
-    return result
+    return ORJSONResponse(result)
 
 
 @router.get("/average-quality/coffee-lot/{coffee_lot_id}", response_model=AverageQualityResponse)
@@ -237,7 +318,7 @@ async def get_average_quality_by_coffee_lot(
     Calcula la calidad promedio de todos los granos analizados de un lote.
     Retorna un porcentaje en escala de 0-100%.
     """
-    result = query_service.get_average_quality_by_coffee_lot(coffee_lot_id)
+    result = await query_service.get_average_quality_by_coffee_lot(coffee_lot_id)
 
     if not result:
         raise HTTPException(
@@ -245,7 +326,7 @@ async def get_average_quality_by_coffee_lot(
             detail=f"No se encontraron análisis para el lote {coffee_lot_id}"
         )
 
-    return result
+    return ORJSONResponse(result)
 
 
 @router.get("/session/{session_id}", response_model=ClassificationSessionResponse)
@@ -256,7 +337,7 @@ async def get_session_by_id(
     """
     Obtiene una sesión específica con todos sus análisis de granos.
     """
-    session = query_service.get_session_by_id(session_id)
+    session = await query_service.get_session_by_id(session_id)
 
     if not session:
         raise HTTPException(
@@ -264,10 +345,10 @@ async def get_session_by_id(
             detail=f"No se encontró la sesión {session_id}"
         )
 
-    return session
+    return StreamingResponse(iter_session_json(session), media_type="application/json")
 
 
-@router.post("/send-report", response_model=SendReportResponse)
+@router.post("/send-report", response_model=SendReportResponse, status_code=202)
 async def send_classification_report_email(
         request: SendReportRequest = Body(...),
         query_service: ClassificationQueryService = Depends(get_query_service),
@@ -278,9 +359,10 @@ async def send_classification_report_email(
 
     Este endpoint permite enviar manualmente el reporte de una sesión
     de clasificación completada a cualquier dirección de email.
+    El envío SMTP se realiza en segundo plano, después de responder.
     """
     # Obtener la sesión
-    session = query_service.get_session_by_id(request.session_id)
+    session = await query_service.get_session_by_id(request.session_id)
 
     if not session:
         raise HTTPException(
@@ -294,15 +376,18 @@ async def send_classification_report_email(
             detail="Solo se pueden enviar reportes de sesiones completadas"
         )
 
+    if not email_service.enabled:
+        raise HTTPException(
+            status_code=503,
+            detail="El envío de reportes no está disponible. Verifique la configuración SMTP."
+        )
+
     try:
         # Obtener datos del lote de café
-        from coffee_lot_management.infrastructure.persistence.database.repositories.coffee_lot_repository import \
-            CoffeeLotRepository
-        lot_repo = CoffeeLotRepository(db)
-        coffee_lot = lot_repo.find_by_id(session.coffee_lot_id)
+        lot_number = get_lot_number_cached(db, session.coffee_lot_id)
 
         coffee_lot_data = {
-            'lot_number': coffee_lot.lot_number if coffee_lot else 'N/A'
+            'lot_number': lot_number or 'N/A'
         }
 
         # Si es un solo grano, agregar sus datos específicos
@@ -320,26 +405,26 @@ async def send_classification_report_email(
             'completed_at': session.completed_at
         }
 
-        # Enviar email
-        success = email_service.send_classification_report(
-            recipient_email=request.recipient_email,
-            classification_data=session_dict,
-            coffee_lot_data=coffee_lot_data
-        )
-
-        if success:
-            return SendReportResponse(
-                success=True,
-                message=f"Reporte enviado exitosamente a {request.recipient_email}"
-            )
-        else:
-            return SendReportResponse(
-                success=False,
-                message="No se pudo enviar el reporte. Verifique la configuración SMTP."
-            )
+        # Encolar el envío: el worker de la cola lo envía y registra el resultado en el log
+        queued = mail_queue.put_nowait({
+            'recipient_email': request.recipient_email,
+            'classification_data': session_dict,
+            'coffee_lot_data': coffee_lot_data
+        })
 
     except Exception as e:
         raise HTTPException(
             status_code=500,
             detail=f"Error al enviar el reporte: {str(e)}"
-        )
\ No newline at end of file
+        )
+
+    if not queued:
+        raise HTTPException(
+            status_code=503,
+            detail="La cola de envío de reportes está llena o detenida. Intente más tarde."
+        )
+
+    return SendReportResponse(
+        success=True,
+        message=f"Reporte en cola de envío a {request.recipient_email}"
+    )
\ No newline at end of file
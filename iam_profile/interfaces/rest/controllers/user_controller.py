@@ -8,6 +8,13 @@ from iam_profile.domain.model.commands.update_profile_command import UpdateProfi
 from iam_profile.domain.model.commands.change_password_command import ChangePasswordCommand
 from iam_profile.application.internal.commandservices.user_command_service import UserCommandService
 
+
+# --- Inyección de Dependencias ---
+
+def get_user_command_service(db: Session = Depends(get_db)) -> UserCommandService:
+    return UserCommandService(db)
+
+
 router = APIRouter(prefix="/api/v1/users", tags=["Users"])
 
 
@@ -15,7 +22,7 @@ router = APIRouter(prefix="/api/v1/users", tags=["Users"])
 async def update_profile(
     user_id: int,
     resource: UpdateProfileResource,
-    db: Session = Depends(get_db)
+    command_service: UserCommandService = Depends(get_user_command_service)
 ):
     """
     Actualiza el perfil de un usuario
@@ -24,7 +31,6 @@ async def update_profile(
         user_id=user_id,
         **resource.model_dump(exclude_unset=True)
     )
-    command_service = UserCommandService(db)
     user = command_service.handle_update_profile(command)
     return UserResource.model_validate(user)
 
@@ -33,7 +39,7 @@ async def update_profile(
 async def change_password(
     user_id: int,
     resource: ChangePasswordResource,
-    db: Session = Depends(get_db)
+    command_service: UserCommandService = Depends(get_user_command_service)
 ):
     """
     Cambia la contraseña de un usuario
@@ -43,6 +49,5 @@ async def change_password(
         current_password=resource.current_password,
         new_password=resource.new_password
     )
-    command_service = UserCommandService(db)
     user = command_service.handle_change_password(command)
     return UserResource.model_validate(user)
\ No newline at end of file
@@ -1,3 +1,5 @@
+import asyncio
+import logging
 import os
 import sys
 
@@ -5,47 +7,64 @@ sys.dont_write_bytecode = True
 os.environ['PYTHONDONTWRITEBYTECODE'] = '1'
 os.environ['TF_ENABLE_ONEDNN_OPTS'] = '0'
 
+# Nivel de logs configurable por entorno (en producción usar LOG_LEVEL=WARNING)
+logging.basicConfig(
+    level=os.getenv("LOG_LEVEL", "INFO").upper(),
+    format="%(asctime)s %(name)s %(levelname)s %(message)s"
+)
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from contextlib import asynccontextmanager
 from shared.infrastructure.persistence.database.repositories.settings import settings
-from shared.domain.database import init_db
+from shared.domain.database import init_db, async_engine
+from shared.infrastructure.notification_service import email_service
+from shared.infrastructure.mail_queue import mail_queue
 # Importar routers
 from iam_profile.interfaces.rest.controllers.auth_controller import router as auth_router
 from iam_profile.interfaces.rest.controllers.profile_controller import router as profile_router
 from iam_profile.interfaces.rest.controllers.user_controller import router as user_router
 from coffee_lot_management.interfaces.rest.controllers.coffee_lot_controller import router as coffee_lot_router
-from grain_classification.interfaces.rest.controllers.classification_controller import router as classification_router
+from grain_classification.interfaces.rest.controllers.classification_controller import router as classification_router, \
+    preload_classification_services
 from traceability_certification.interfaces.rest.controllers.certification_controller import router as certification_router
 
+logger = logging.getLogger(__name__)
 
-# Backend configuration
-BACKEND_URL = os.environ.get(
-    "BACKEND_URL",
-    "https://bean-detect-ai-api-platform.azurewebsites.net"
-)
 
 @asynccontextmanager
 async def lifespan(_app: FastAPI):
     """Eventos de inicio y cierre del ciclo de vida de la aplicación"""
-    print("=" * 60)
-    print("🚀 Iniciando BeanDetect AI Backend")
-    print("=" * 60)
+    logger.info("Iniciando BeanDetect AI Backend")
 
     # Startup - Base de datos
-    print("\n[1/1] Inicializando base de datos...")
+    logger.info("[1/2] Inicializando base de datos...")
     init_db()
-    print("Base de datos inicializada")
+    logger.info("Base de datos inicializada")
+
+    # Startup - Servicios de clasificación (modelo CNN precargado)
+    logger.info("[2/2] Cargando servicios de clasificación...")
+    preload_classification_services(_app)
+    logger.info("Servicios de clasificación listos")
+
+    # Startup - Conexión SMTP precalentada (en un hilo: el handshake no bloquea el event loop)
+    await asyncio.to_thread(email_service.warmup)
+
+    # Startup - Cola de envío de reportes por email
+    mail_queue.start()
+    _app.state.mail_queue = mail_queue
 
-    print("\n" + "=" * 60)
-    print(f"{settings.PROJECT_NAME} está corriendo")
-    print(f"Documentación: http://localhost:8000/docs")
-    print("=" * 60 + "\n")
+    logger.info("%s está corriendo. Documentación: http://localhost:8000/docs", settings.PROJECT_NAME)
 
     yield  # Aquí FastAPI empieza a aceptar peticiones
 
     # Shutdown
-    print("\n🛑 Apagando servidor...")
+    logger.info("Apagando servidor...")
+    await mail_queue.stop()
+    email_service.close()
+    await email_service.aclose()
+    await async_engine.dispose()
 
 
 # Crear aplicación FastAPI (usando lifespan)
@@ -55,6 +74,7 @@ app = FastAPI(
     docs_url="/docs",
     redoc_url="/redoc",
     lifespan=lifespan,
+    default_response_class=ORJSONResponse,
 )
 
 # Configurar CORS
@@ -64,6 +84,8 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Cursor de paginación y validadores de caché legibles desde el frontend
+    expose_headers=["X-Next-Cursor", "ETag"],
 )
 
 # Incluir routers
@@ -83,7 +105,7 @@ async def root():
         "service": "BeanDetect AI API",
         "version": "1.0.0",
         "status": "running",
-        "backend": BACKEND_URL,
+        "backend": settings.BACKEND_URL,
         "docs": "/docs",
         "re-docs": "/redoc"
     }
@@ -92,9 +114,23 @@ async def root():
 if __name__ == "__main__":
     import uvicorn
 
-    uvicorn.run(
-        "main:app",
-        host="0.0.0.0",
-        port=8000,
-        log_level="info"
-    )
\ No newline at end of file
+    if settings.ENVIRONMENT == "production":
+        # Cada worker es un proceso nuevo que importa "main:app" y carga el modelo en su
+        # propio lifespan; el proceso supervisor no carga el modelo.
+        uvicorn.run(
+            "main:app",
+            host="0.0.0.0",
+            port=8000,
+            workers=settings.WORKERS or os.cpu_count(),
+            loop="uvloop",
+            http="httptools",
+            log_level="warning"
+        )
+    else:
+        uvicorn.run(
+            "main:app",
+            host="0.0.0.0",
+            port=8000,
+            reload=True,
+            log_level="info"
+        )
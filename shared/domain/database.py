@@ -1,41 +1,101 @@
+import logging
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, Session
-from typing import Generator
+from typing import AsyncGenerator, Generator
 from shared.infrastructure.persistence.database.repositories.settings import settings
 
+logger = logging.getLogger(__name__)
 
 # Validación de la URL de conexión
-print(f"[DEBUG] Inicializando engine con URL: {settings.DATABASE_URL.split('@')[0]}@***")
+logger.debug("Inicializando engine con URL: %s@***", settings.DATABASE_URL.split('@')[0])
 
 engine = create_engine(
     settings.DATABASE_URL,
     pool_pre_ping=True,
-    pool_size=10,
-    max_overflow=20,
+    pool_size=settings.POOL_SIZE,
+    max_overflow=settings.MAX_OVERFLOW,
+    pool_recycle=settings.POOL_RECYCLE,  # renovar conexiones antes de que el servidor las cierre por inactividad
+    pool_timeout=settings.POOL_TIMEOUT,
+    connect_args={"options": f"-c statement_timeout={settings.STATEMENT_TIMEOUT_MS}"},
     echo=False,  # Cambiar a True para debug SQL
 )
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Mismo pool en modo AUTOCOMMIT para endpoints de solo lectura: sin BEGIN/COMMIT por request
+ro_engine = engine.execution_options(isolation_level="AUTOCOMMIT")
+ReadOnlySession = sessionmaker(bind=ro_engine, autoflush=False, expire_on_commit=False)
+
+# Engine asíncrono (asyncpg) para consultas de lectura desde endpoints async, con su propio
+# pool más chico (se suma al del engine síncrono en el total de conexiones por worker)
+async_engine = create_async_engine(
+    settings.ASYNC_DATABASE_URL,
+    pool_pre_ping=True,
+    pool_size=settings.ASYNC_POOL_SIZE,
+    max_overflow=settings.ASYNC_MAX_OVERFLOW,
+    pool_recycle=settings.POOL_RECYCLE,
+    pool_timeout=settings.POOL_TIMEOUT,
+    connect_args={"server_settings": {"statement_timeout": str(settings.STATEMENT_TIMEOUT_MS)}},
+)
+
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+async_ro_engine = async_engine.execution_options(isolation_level="AUTOCOMMIT")
+AsyncReadOnlySession = async_sessionmaker(async_ro_engine, autoflush=False, expire_on_commit=False)
+
 Base = declarative_base()
 
 
 def get_db() -> Generator[Session, None, None]:
-    """Dependency para obtener sesión de base de datos"""
+    """
+    Dependency para obtener sesión de base de datos (unit of work por request):
+    lo que los repositorios dejen pendiente con flush se confirma en un único commit
+    al terminar el endpoint, o se descarta si el endpoint lanzó una excepción.
+    """
     db = SessionLocal()
+    try:
+        yield db
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def get_ro_db() -> Generator[Session, None, None]:
+    """Dependency para obtener sesión de solo lectura (AUTOCOMMIT, sin transacción explícita)"""
+    db = ReadOnlySession()
     try:
         yield db
     finally:
         db.close()
 
 
+async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
+    """Dependency para obtener sesión asíncrona de base de datos"""
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+async def get_async_ro_db() -> AsyncGenerator[AsyncSession, None]:
+    """Dependency para obtener sesión asíncrona de solo lectura (AUTOCOMMIT)"""
+    async with AsyncReadOnlySession() as db:
+        yield db
+
+
 def init_db():
     """Inicializa la base de datos creando todas las tablas"""
     try:
-        print("[INFO] Creando tablas en la base de datos...")
+        logger.info("Creando tablas en la base de datos...")
         Base.metadata.create_all(bind=engine)
-        print("[INFO] Tablas creadas exitosamente")
+        # create_all no agrega índices nuevos a tablas ya existentes
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(bind=engine, checkfirst=True)
+        logger.info("Tablas creadas exitosamente")
     except Exception as e:
-        print(f"[ERROR] Error al crear tablas: {e}")
+        logger.error("Error al crear tablas: %s", e)
         raise
\ No newline at end of file
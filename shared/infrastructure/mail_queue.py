@@ -0,0 +1,111 @@
+# shared/infrastructure/mail_queue.py
+
+import asyncio
+import logging
+from typing import Any, Dict, Optional
+
+from shared.infrastructure.notification_service import EmailNotificationService, email_service
+
+logger = logging.getLogger(__name__)
+
+# Reportes que el consumidor toma de la cola por iteración (se envían como un lote)
+MAIL_BATCH_SIZE = 32
+
+# Tiempo máximo que el apagado espera a que se envíen los reportes pendientes
+MAIL_STOP_TIMEOUT_SECONDS = 10.0
+
+
+class MailQueue:
+    """
+    Cola en memoria de reportes por email. Los endpoints encolan y responden de
+    inmediato; una tarea en segundo plano del event loop los envía en lotes con
+    las conexiones SMTP asíncronas del servicio de email.
+    """
+
+    def __init__(self, service: EmailNotificationService, maxsize: int = 10_000):
+        self._service = service
+        self._maxsize = maxsize
+        self._queue: Optional[asyncio.Queue] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._consumer: Optional[asyncio.Task] = None
+        # Reportes del lote que el consumidor está enviando (ya fuera de la cola)
+        self._in_flight = 0
+
+    @property
+    def running(self) -> bool:
+        return self._consumer is not None
+
+    def start(self) -> None:
+        """Crea la cola y la tarea consumidora (llamar desde el lifespan)."""
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue(maxsize=self._maxsize)
+        self._consumer = asyncio.create_task(self._consume(), name="mail-queue-consumer")
+
+    async def stop(self, timeout: float = MAIL_STOP_TIMEOUT_SECONDS) -> None:
+        """
+        Espera (hasta timeout segundos) a que se envíen los reportes pendientes y detiene
+        el consumidor. Los que sigan en la cola al vencer el plazo se descartan.
+        """
+        if self._consumer is None:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.error("Se descartan %d reportes pendientes al apagar la cola de emails",
+                         self._queue.qsize() + self._in_flight)
+        self._consumer.cancel()
+        try:
+            await self._consumer
+        except asyncio.CancelledError:
+            pass
+        self._consumer = None
+
+    def put_nowait(self, item: Dict[str, Any]) -> bool:
+        """
+        Encola un reporte desde el event loop sin esperar lugar en la cola.
+
+        Args:
+            item: dict con recipient_email, classification_data y opcionalmente coffee_lot_data
+
+        Returns:
+            False si la cola no está corriendo o está llena
+        """
+        if self._consumer is None:
+            return False
+        try:
+            self._queue.put_nowait(item)
+        except asyncio.QueueFull:
+            return False
+        return True
+
+    def submit_threadsafe(self, item: Dict[str, Any]) -> None:
+        """Encola un reporte desde un hilo del threadpool (p. ej. el pipeline de clasificación)."""
+        self._loop.call_soon_threadsafe(self._put_nowait, item)
+
+    def _put_nowait(self, item: Dict[str, Any]) -> None:
+        if not self.put_nowait(item):
+            logger.error("Cola de emails llena o detenida; se descarta el reporte para %s",
+                         item.get('recipient_email'))
+
+    async def _consume(self) -> None:
+        while True:
+            batch = [await self._queue.get()]
+            while len(batch) < MAIL_BATCH_SIZE:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except asyncio.QueueEmpty:
+                    break
+
+            self._in_flight = len(batch)
+            try:
+                await self._service.send_reports_batch_async(batch)
+            except Exception as e:
+                logger.error("Error al enviar lote de reportes: %s", e)
+            finally:
+                self._in_flight = 0
+                for _ in batch:
+                    self._queue.task_done()
+
+
+# Singleton global
+mail_queue = MailQueue(email_service)
@@ -1,16 +1,44 @@
 # shared/infrastructure/notification_service.py
 
+import asyncio
+import atexit
+import logging
 import os
 import smtplib
 from datetime import datetime
+from itertools import count
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 
-from dotenv import load_dotenv
+import aiosmtplib
+import jinja2
 
-# Cargar variables de entorno desde .env
-load_dotenv()
+from shared.infrastructure.persistence.database.repositories.settings import settings
+from shared.infrastructure.smtp_pool import MAX_MESSAGES_PER_CONNECTION, get_smtp_pool, tls_context
+
+logger = logging.getLogger(__name__)
+
+# Un lote de al menos FAST_FAIL_MIN_BATCH correos se aborta si falla un tercio de los envíos
+FAST_FAIL_MIN_BATCH = 30
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(__file__), 'templates')
+
+# La plantilla se compila una sola vez al importar el módulo; el bytecode compilado
+# queda en disco y los procesos siguientes (workers, reinicios) no vuelven a parsearla.
+# El <head> con el CSS es estático (report_head.html.j2) y se incluye como texto constante;
+# sin auto_reload el include se resuelve desde la caché del Environment sin consultar el disco.
+_template_env = jinja2.Environment(
+    loader=jinja2.FileSystemLoader(TEMPLATE_DIR),
+    autoescape=True,
+    trim_blocks=True,
+    auto_reload=False,
+    # Sin directorio explícito Jinja usa uno propio por usuario con permisos 0700 (otro usuario
+    # local no puede plantar bytecode que luego se ejecute)
+    bytecode_cache=jinja2.FileSystemBytecodeCache()
+)
+_report_template = _template_env.get_template('classification_report.html.j2')
+_template_env.get_template('report_head.html.j2')  # compilar también el include al importar
 
 
 def _generate_report_html(
@@ -18,15 +46,15 @@ def _generate_report_html(
         coffee_lot_data: Optional[Dict[str, Any]] = None
 ) -> str:
     """
-    Genera el contenido HTML del reporte de clasificación.
+    Genera el contenido HTML del reporte de clasificación a partir de la
+    plantilla precompilada (templates/classification_report.html.j2).
     """
     result = classification_data.get('classification_result', {})
     session_id = classification_data.get('session_id_vo', 'N/A')
     total_beans = result.get('total_beans_analyzed', 0)
     processing_time = classification_data.get('processing_time_seconds', 0)
 
-    # Obtener distribución de calidad
-    quality_dist = result.get('quality_distribution', {})
+    # Obtener puntaje promedio
     avg_score = result.get('average_quality_score', 0) * 100
 
     # Verificar si es un análisis de grano individual
@@ -48,192 +76,151 @@ def _generate_report_html(
     else:
         fecha_str = completed_at.strftime('%Y-%m-%d')
 
-    html = f"""
-    <!DOCTYPE html>
-    <html>
-    <head>
-        <meta charset="UTF-8">
-        <style>
-            body {{
-                font-family: Arial, sans-serif;
-                line-height: 1.6;
-                color: #333;
-                max-width: 800px;
-                margin: 0 auto;
-                padding: 20px;
-            }}
-            .header {{
-                background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-                color: white;
-                padding: 30px;
-                border-radius: 10px;
-                margin-bottom: 30px;
-            }}
-            .header h1 {{
-                margin: 0;
-                font-size: 28px;
-            }}
-            .header p {{
-                margin: 10px 0 0 0;
-                opacity: 0.9;
-            }}
-            .info-card {{
-                background: #f8f9fa;
-                border-left: 4px solid #667eea;
-                padding: 20px;
-                margin-bottom: 20px;
-                border-radius: 5px;
-            }}
-            .info-row {{
-                display: flex;
-                justify-content: space-between;
-                margin-bottom: 10px;
-            }}
-            .info-label {{
-                font-weight: bold;
-                color: #555;
-            }}
-            .info-value {{
-                color: #333;
-            }}
-            .quality-section {{
-                margin: 30px 0;
-            }}
-            .quality-bar {{
-                background: #e0e0e0;
-                border-radius: 10px;
-                height: 30px;
-                overflow: hidden;
-                margin: 10px 0;
-            }}
-            .quality-fill {{
-                background: linear-gradient(90deg, #4CAF50 0%, #8BC34A 100%);
-                height: 100%;
-                display: flex;
-                align-items: center;
-                justify-content: center;
-                color: white;
-                font-weight: bold;
-            }}
-            .distribution-table {{
-                width: 100%;
-                border-collapse: collapse;
-                margin: 20px 0;
-            }}
-            .distribution-table th,
-            .distribution-table td {{
-                padding: 12px;
-                text-align: left;
-                border-bottom: 1px solid #ddd;
-            }}
-            .distribution-table th {{
-                background-color: #667eea;
-                color: white;
-            }}
-            .distribution-table tr:hover {{
-                background-color: #f5f5f5;
-            }}
-            .footer {{
-                margin-top: 40px;
-                padding-top: 20px;
-                border-top: 2px solid #e0e0e0;
-                text-align: center;
-                color: #777;
-                font-size: 14px;
-            }}
-            .metric {{
-                display: inline-block;
-                background: white;
-                border: 2px solid #667eea;
-                border-radius: 8px;
-                padding: 15px 25px;
-                margin: 10px;
-                text-align: center;
-            }}
-            .metric-value {{
-                font-size: 32px;
-                font-weight: bold;
-                color: #667eea;
-            }}
-            .metric-label {{
-                font-size: 14px;
-                color: #666;
-                margin-top: 5px;
-            }}
-        </style>
-    </head>
-    <body>
-        <div class="header">
-            <h1>Reporte de Clasificación de Café</h1>
-            <p>Sesión: {session_id}</p>
-        </div>
-
-        <div class="info-card">
-            <div class="info-row">
-                <span class="info-label">Lote de Café:</span>
-                <span class="info-value">{lot_name}</span>
-            </div>
-            <div class="info-row">
-                <span class="info-label">Fecha de Clasificación:</span>
-                <span class="info-value">{fecha_str}</span>
-            </div>
-            <div class="info-row">
-                <span class="info-label">Tiempo de Procesamiento:</span>
-                <span class="info-value">{processing_time:.2f} segundos</span>
-            </div>
-        </div>
-
-        <div class="quality-section">
-            <h2>Resultados de Análisis</h2>
-
-            <div style="text-align: center; margin: 30px 0;">"""
-
-    # Mostrar métricas según si es un solo grano o múltiples
-    if is_single_grain:
-        html += f"""
-                <div class="metric">
-                    <div class="metric-value">#{single_grain_id}</div>
-                    <div class="metric-label">Grano Analizado</div>
-                </div>
-                <div class="metric">
-                    <div class="metric-value">{single_grain_score:.1f}%</div>
-                    <div class="metric-label">Puntaje Obtenido</div>
-                </div>
-                <div class="metric">
-                    <div class="metric-value">{single_grain_category}</div>
-                    <div class="metric-label">Categoría Final</div>
-                </div>"""
-
-    html += """
-                </tbody>
-            </table>
-        </div>
-
-        <div class="footer">
-            <p><strong>BeanDetect AI</strong> - Sistema de Clasificación Inteligente de Café</p>
-            <p>Este reporte fue generado automáticamente por el sistema.</p>
-        </div>
-    </body>
-    </html>
+    return _report_template.render(
+        session_id=session_id,
+        lot_name=lot_name,
+        fecha_str=fecha_str,
+        processing_time=processing_time,
+        is_single_grain=is_single_grain,
+        single_grain_id=single_grain_id,
+        single_grain_score=single_grain_score,
+        single_grain_category=single_grain_category
+    )
+
+
+class _AsyncSMTPConnection:
+    """
+    Conexión aiosmtplib persistente. SMTP es secuencial por conexión, así que los
+    envíos sobre ella se serializan con un asyncio.Lock; el paralelismo se logra
+    usando varias conexiones a la vez.
     """
 
-    return html
+    def __init__(self, host: str, port: int, username: str, password: str):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self._client: Optional[aiosmtplib.SMTP] = None
+        self._sent = 0
+        self._lock = asyncio.Lock()
+
+    async def _ensure_connected(self) -> aiosmtplib.SMTP:
+        """Reutiliza la conexión si responde al NOOP y no alcanzó el límite de mensajes."""
+        if self._client is not None and self._client.is_connected and self._sent < MAX_MESSAGES_PER_CONNECTION:
+            try:
+                if (await self._client.noop()).code == 250:
+                    return self._client
+            except aiosmtplib.SMTPException:
+                pass
+
+        await self._disconnect()
+        client = aiosmtplib.SMTP(hostname=self.host, port=self.port, start_tls=False,
+                                 timeout=settings.SMTP_TIMEOUT_SECONDS)
+        await client.connect()
+        await client.starttls(tls_context=tls_context)
+        await client.login(self.username, self.password)
+        tls_context.remember_session(self.host, client.get_transport_info('ssl_object').session)
+        self._client = client
+        self._sent = 0
+        return client
+
+    async def _disconnect(self) -> None:
+        if self._client is None:
+            return
+        try:
+            await self._client.quit()
+        except aiosmtplib.SMTPException:
+            self._client.close()
+        self._client = None
+
+    async def send(self, message: MIMEMultipart) -> None:
+        async with self._lock:
+            try:
+                await (await self._ensure_connected()).send_message(message)
+            except aiosmtplib.SMTPServerDisconnected:
+                # La conexión se cayó entre el NOOP y el envío: reconectar una vez
+                await self._disconnect()
+                await (await self._ensure_connected()).send_message(message)
+            self._sent += 1
+
+    async def close(self) -> None:
+        async with self._lock:
+            await self._disconnect()
 
 
 class EmailNotificationService:
     """
     Servicio para envío de notificaciones por correo electrónico usando SMTP.
     No requiere servicios de pago - usa configuración SMTP del usuario.
+    Reutiliza conexiones autenticadas de un pool para no repetir el handshake
+    TCP + STARTTLS + AUTH en cada correo.
     """
 
     def __init__(self):
-        # Configuración SMTP desde variables de entorno
-        self.smtp_server = os.getenv("SMTP_SERVER", "smtp.gmail.com")
-        self.smtp_port = int(os.getenv("SMTP_PORT", "587"))
-        self.smtp_username = os.getenv("SMTP_USERNAME", "")
-        self.smtp_password = os.getenv("SMTP_PASSWORD", "")
-        self.sender_email = os.getenv("SMTP_SENDER_EMAIL", self.smtp_username)
+        # Configuración SMTP desde settings (pydantic-settings ya leyó el .env y tipó los valores)
+        self.smtp_server = settings.SMTP_SERVER
+        self.smtp_port = settings.SMTP_PORT
+        self.smtp_username = settings.SMTP_USERNAME
+        self.smtp_password = settings.SMTP_PASSWORD
+        self.sender_email = settings.SMTP_SENDER_EMAIL or self.smtp_username
         self.enabled = bool(self.smtp_username and self.smtp_password)
+        self._pool = get_smtp_pool(
+            self.smtp_server,
+            self.smtp_port,
+            self.smtp_username,
+            self.smtp_password,
+            max_size=settings.SMTP_POOL_SIZE,
+            timeout=settings.SMTP_TIMEOUT_SECONDS
+        )
+        # Conexiones asíncronas para envíos desde el event loop (se conectan al primer uso)
+        self._async_connections = [
+            _AsyncSMTPConnection(self.smtp_server, self.smtp_port, self.smtp_username, self.smtp_password)
+            for _ in range(settings.SMTP_POOL_SIZE)
+        ]
+        self._next_async_connection = count()
+
+    def warmup(self) -> None:
+        """Abre una conexión SMTP autenticada al iniciar, para que el primer envío no pague el handshake."""
+        if self.enabled:
+            self._pool.warmup()
+
+    def close(self) -> None:
+        """Cierra las conexiones SMTP del pool (al apagar la aplicación)."""
+        self._pool.close()
+
+    async def aclose(self) -> None:
+        """Cierra las conexiones asíncronas (al apagar la aplicación)."""
+        await asyncio.gather(*(connection.close() for connection in self._async_connections))
+
+    def _build_message(
+            self,
+            recipient_email: str,
+            classification_data: Dict[str, Any],
+            coffee_lot_data: Optional[Dict[str, Any]] = None
+    ) -> MIMEMultipart:
+        """Construye el mensaje MIME con el reporte HTML."""
+        message = MIMEMultipart("alternative")
+        message["Subject"] = f"Reporte de Clasificación - {classification_data.get('session_id_vo', 'N/A')}"
+        message["From"] = self.sender_email
+        message["To"] = recipient_email
+
+        # Generar contenido HTML del reporte
+        html_content = _generate_report_html(classification_data, coffee_lot_data)
+
+        # Adjuntar contenido HTML
+        html_part = MIMEText(html_content, "html")
+        message.attach(html_part)
+        return message
+
+    def _send(self, message: MIMEMultipart) -> None:
+        """Envía un mensaje con una conexión prestada del pool."""
+        try:
+            with self._pool.borrow() as smtp:
+                smtp.send_message(message)
+        except (smtplib.SMTPServerDisconnected, ConnectionError):
+            # La conexión se cayó entre el NOOP y el envío: reintentar una vez con otra
+            with self._pool.borrow() as smtp:
+                smtp.send_message(message)
 
     def send_classification_report(
             self,
@@ -253,36 +240,102 @@ class EmailNotificationService:
             bool: True si el envío fue exitoso, False en caso contrario
         """
         if not self.enabled:
-            print("Servicio de email no configurado. Configure SMTP_USERNAME y SMTP_PASSWORD.")
+            logger.warning("Servicio de email no configurado. Configure SMTP_USERNAME y SMTP_PASSWORD.")
+            return False
+
+        try:
+            message = self._build_message(recipient_email, classification_data, coffee_lot_data)
+
+            self._send(message)
+
+            logger.info("Email enviado exitosamente a %s", recipient_email)
+            return True
+
+        except Exception as e:
+            logger.error("Error al enviar email: %s", e)
+            return False
+
+    async def send_classification_report_async(
+            self,
+            recipient_email: str,
+            classification_data: Dict[str, Any],
+            coffee_lot_data: Optional[Dict[str, Any]] = None
+    ) -> bool:
+        """
+        Versión asíncrona de send_classification_report (aiosmtplib): el event loop sigue
+        atendiendo otros requests mientras dura el handshake y el envío.
+        """
+        if not self.enabled:
+            logger.warning("Servicio de email no configurado. Configure SMTP_USERNAME y SMTP_PASSWORD.")
             return False
 
+        connection = self._async_connections[next(self._next_async_connection) % len(self._async_connections)]
         try:
-            # Crear mensaje
-            message = MIMEMultipart("alternative")
-            message["Subject"] = f"Reporte de Clasificación - {classification_data.get('session_id_vo', 'N/A')}"
-            message["From"] = self.sender_email
-            message["To"] = recipient_email
-
-            # Generar contenido HTML del reporte
-            html_content = _generate_report_html(classification_data, coffee_lot_data)
-
-            # Adjuntar contenido HTML
-            html_part = MIMEText(html_content, "html")
-            message.attach(html_part)
-
-            # Enviar email
-            with smtplib.SMTP(self.smtp_server, self.smtp_port) as server:
-                server.starttls()
-                server.login(self.smtp_username, self.smtp_password)
-                server.send_message(message)
-
-            print(f"Email enviado exitosamente a {recipient_email}")
+            message = self._build_message(recipient_email, classification_data, coffee_lot_data)
+            await connection.send(message)
+
+            logger.info("Email enviado exitosamente a %s", recipient_email)
             return True
 
         except Exception as e:
-            print(f"Error al enviar email: {e}")
+            logger.error("Error al enviar email: %s", e)
             return False
 
+    async def send_reports_batch_async(self, items: List[Dict[str, Any]]) -> int:
+        """
+        Envía varios reportes repartiéndolos entre las conexiones asíncronas,
+        que trabajan en paralelo con asyncio.gather (cada conexión se renueva cada
+        MAX_MESSAGES_PER_CONNECTION mensajes). En lotes grandes se aborta si falla
+        un tercio de los envíos.
+
+        Args:
+            items: Lista de dicts con recipient_email, classification_data y
+                opcionalmente coffee_lot_data (mismos argumentos que send_classification_report)
+
+        Returns:
+            int: Cantidad de reportes enviados exitosamente
+        """
+        if not self.enabled:
+            logger.warning("Servicio de email no configurado. Configure SMTP_USERNAME y SMTP_PASSWORD.")
+            return 0
+
+        fail_limit = len(items) / 3 if len(items) >= FAST_FAIL_MIN_BATCH else None
+        failed = 0
+
+        async def send_chunk(connection: _AsyncSMTPConnection, chunk: List[Dict[str, Any]]) -> int:
+            nonlocal failed
+            sent = 0
+            for item in chunk:
+                # El contador de fallos es compartido por todas las conexiones del lote
+                if fail_limit is not None and failed >= fail_limit:
+                    break
+                try:
+                    message = self._build_message(
+                        item['recipient_email'],
+                        item['classification_data'],
+                        item.get('coffee_lot_data')
+                    )
+                    await connection.send(message)
+                    sent += 1
+                except Exception as e:
+                    failed += 1
+                    logger.error("Error al enviar email a %s: %s", item.get('recipient_email'), e)
+            return sent
+
+        connections = self._async_connections
+        results = await asyncio.gather(*(
+            send_chunk(connection, items[index::len(connections)])
+            for index, connection in enumerate(connections)
+            if index < len(items)
+        ))
+
+        sent = sum(results)
+        if fail_limit is not None and failed >= fail_limit:
+            logger.error("Lote de reportes abortado: %d fallos de %d", failed, len(items))
+        logger.info("Lote de reportes enviado: %d de %d", sent, len(items))
+        return sent
+
 
 # Singleton global
-email_service = EmailNotificationService()
\ No newline at end of file
+email_service = EmailNotificationService()
+atexit.register(email_service.close)
@@ -5,6 +5,11 @@ class Settings(BaseSettings):
     # API Settings
     API_V1_STR: str = "/api/v1"
     PROJECT_NAME: str = "BeanDetect AI"
+    ENVIRONMENT: str = "development"  # "development" o "production"
+    BACKEND_URL: str = "https://bean-detect-ai-api-platform.azurewebsites.net"
+
+    # Servidor (solo para ejecución directa con `python main.py`)
+    WORKERS: int = 0  # 0 = un worker por núcleo disponible
 
     # Database Settings
     DATABASE_HOST: str = "dev-beans-production-db.postgres.database.azure.com"
@@ -13,6 +18,16 @@ class Settings(BaseSettings):
     DATABASE_USER: str = "useradmin"  # nombre de usuario
     DATABASE_PASSWORD: str = "dev-beans-1234"
 
+    # Connection Pools por worker (engine síncrono + engine asyncpg):
+    # workers x (POOL_SIZE + MAX_OVERFLOW + ASYNC_POOL_SIZE + ASYNC_MAX_OVERFLOW) debe caber en max_connections
+    POOL_SIZE: int = 10
+    MAX_OVERFLOW: int = 20
+    ASYNC_POOL_SIZE: int = 5  # solo lecturas desde endpoints async
+    ASYNC_MAX_OVERFLOW: int = 5
+    POOL_RECYCLE: int = 1800  # segundos
+    POOL_TIMEOUT: int = 5  # segundos de espera por una conexión libre
+    STATEMENT_TIMEOUT_MS: int = 30000
+
     # Security
     SECRET_KEY: str = "your-secret-key-here-change-in-production"
     ALGORITHM: str = "HS256"
@@ -21,6 +36,14 @@ class Settings(BaseSettings):
     # BLOB Storage
     MODEL_BLOB_URL: str = "https://devbeansteamstorage.blob.core.windows.net/ml-models/defect_detector.h5"
 
+    # ML Model
+    MODEL_PATH: str = "grain_classification/infrastructure/ml_models/defect_detector.h5"
+    ML_INTRA_OP_THREADS: int = 0  # 0 = usar todos los núcleos disponibles
+    ML_INTER_OP_THREADS: int = 2
+    ML_XLA_JIT: bool = True  # compilar el modelo Keras con XLA (fusión de capas)
+    ML_MAX_BATCH_SIZE: int = 64  # granos por pasada del modelo al agrupar requests
+    ML_BATCH_WAIT_MS: float = 20.0  # espera máxima para completar un lote
+
     # CORS
     BACKEND_CORS_ORIGINS: list = ["*"]
 
@@ -35,11 +58,17 @@ class Settings(BaseSettings):
     SMTP_USERNAME: str = ""
     SMTP_PASSWORD: str = ""
     SMTP_SENDER_EMAIL: str = ""
+    SMTP_POOL_SIZE: int = 5  # conexiones SMTP autenticadas reutilizables por proceso
+    SMTP_TIMEOUT_SECONDS: float = 10.0  # conexión y operaciones SMTP (un servidor caído no retiene el slot)
 
     @property
     def DATABASE_URL(self) -> str:
         return f"postgresql+psycopg://{self.DATABASE_USER}:{self.DATABASE_PASSWORD}@{self.DATABASE_HOST}:{self.DATABASE_PORT}/{self.DATABASE_NAME}"
 
+    @property
+    def ASYNC_DATABASE_URL(self) -> str:
+        return f"postgresql+asyncpg://{self.DATABASE_USER}:{self.DATABASE_PASSWORD}@{self.DATABASE_HOST}:{self.DATABASE_PORT}/{self.DATABASE_NAME}"
+
     class Config:
         env_file = ".env"
         case_sensitive = True
@@ -0,0 +1,180 @@
+# shared/infrastructure/smtp_pool.py
+
+import logging
+import queue
+import smtplib
+import ssl
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Mensajes enviados por conexión antes de reemplazarla (reutilizar, pero renovar periódicamente)
+MAX_MESSAGES_PER_CONNECTION = 100
+
+
+class ResumingSSLContext(ssl.SSLContext):
+    """
+    Contexto TLS que recuerda la última sesión (ticket) por servidor y la ofrece en
+    los handshakes siguientes: las reconexiones hacen un handshake abreviado en vez
+    de repetir la verificación de certificado y el intercambio de claves completos.
+    """
+
+    def __new__(cls):
+        return super().__new__(cls, ssl.PROTOCOL_TLS_CLIENT)
+
+    def __init__(self):
+        # PROTOCOL_TLS_CLIENT ya exige certificado válido y verifica el hostname
+        self.load_default_certs()
+        # Mantener habilitados los session tickets
+        self.options &= ~ssl.OP_NO_TICKET
+        self._sessions: Dict[str, ssl.SSLSession] = {}
+        self._sessions_lock = threading.Lock()
+
+    def remember_session(self, server_hostname: str, session: ssl.SSLSession | None) -> None:
+        """Guarda la sesión de un handshake completo (llamar después de login, cuando ya llegó el ticket)."""
+        if session is not None:
+            with self._sessions_lock:
+                self._sessions[server_hostname] = session
+
+    def wrap_socket(self, sock, *args, server_hostname=None, session=None, **kwargs):
+        # smtplib.SMTP.starttls usa wrap_socket
+        if session is None and server_hostname is not None:
+            session = self._sessions.get(server_hostname)
+        return super().wrap_socket(sock, *args, server_hostname=server_hostname, session=session, **kwargs)
+
+    def wrap_bio(self, incoming, outgoing, *args, server_hostname=None, session=None, **kwargs):
+        # asyncio (aiosmtplib) usa wrap_bio
+        if session is None and server_hostname is not None:
+            session = self._sessions.get(server_hostname)
+        return super().wrap_bio(incoming, outgoing, *args, server_hostname=server_hostname, session=session, **kwargs)
+
+
+# Contexto TLS compartido por todas las conexiones SMTP del proceso
+tls_context = ResumingSSLContext()
+
+
+class _PooledConnection:
+    """Conexión SMTP autenticada junto con la cantidad de mensajes enviados por ella."""
+
+    def __init__(self, smtp: smtplib.SMTP):
+        self.smtp = smtp
+        self.sent = 0
+
+
+class SMTPConnectionPool:
+    """
+    Pool de conexiones SMTP autenticadas (TCP + STARTTLS + login ya realizados).
+    Cada hilo toma una conexión libre o crea una nueva hasta max_size; al devolverla
+    se descarta si dejó de responder al NOOP o si alcanzó MAX_MESSAGES_PER_CONNECTION.
+    """
+
+    def __init__(self, host: str, port: int, username: str, password: str, max_size: int = 5,
+                 timeout: float = 10.0):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.max_size = max_size
+        self.timeout = timeout
+        self._idle: queue.LifoQueue[_PooledConnection] = queue.LifoQueue(maxsize=max_size)
+        # Limita las conexiones abiertas (ociosas + prestadas) a max_size
+        self._slots = threading.BoundedSemaphore(max_size)
+
+    def _connect(self) -> _PooledConnection:
+        """Abre una conexión nueva: TCP, STARTTLS (reanudando la sesión TLS si existe) y login."""
+        smtp = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        smtp.starttls(context=tls_context)
+        smtp.login(self.username, self.password)
+        tls_context.remember_session(self.host, smtp.sock.session)
+        return _PooledConnection(smtp)
+
+    @staticmethod
+    def _is_alive(connection: _PooledConnection) -> bool:
+        try:
+            return connection.smtp.noop()[0] == 250
+        except OSError:
+            # smtplib.SMTPException también hereda de OSError
+            return False
+
+    @staticmethod
+    def _discard(connection: _PooledConnection) -> None:
+        try:
+            connection.smtp.quit()
+        except OSError:
+            connection.smtp.close()
+
+    def _take(self) -> _PooledConnection:
+        """Devuelve una conexión ociosa que siga viva o, si no hay, una nueva."""
+        while True:
+            try:
+                connection = self._idle.get_nowait()
+            except queue.Empty:
+                return self._connect()
+            if self._is_alive(connection):
+                return connection
+            self._discard(connection)
+
+    @contextmanager
+    def borrow(self, messages: int = 1) -> Iterator[smtplib.SMTP]:
+        """
+        Presta una conexión para enviar `messages` mensajes. Si el envío falla la
+        conexión se descarta; si no, vuelve al pool.
+        """
+        self._slots.acquire()
+        try:
+            connection = self._take()
+            try:
+                yield connection.smtp
+            except BaseException:
+                self._discard(connection)
+                raise
+            connection.sent += messages
+            self._release(connection)
+        finally:
+            self._slots.release()
+
+    def _release(self, connection: _PooledConnection) -> None:
+        if connection.sent >= MAX_MESSAGES_PER_CONNECTION:
+            self._discard(connection)
+            return
+        try:
+            self._idle.put_nowait(connection)
+        except queue.Full:
+            self._discard(connection)
+
+    def warmup(self, count: int = 1) -> None:
+        """Abre y autentica `count` conexiones por adelantado (al iniciar la aplicación)."""
+        for _ in range(min(count, self.max_size) - self._idle.qsize()):
+            try:
+                self._idle.put_nowait(self._connect())
+            except queue.Full:
+                break
+            except OSError as e:
+                logger.warning("No se pudo precalentar la conexión SMTP: %s", e)
+                break
+
+    def close(self) -> None:
+        """Cierra todas las conexiones ociosas."""
+        while True:
+            try:
+                self._discard(self._idle.get_nowait())
+            except queue.Empty:
+                return
+
+
+_pools: Dict[Tuple[str, int, str], SMTPConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_smtp_pool(host: str, port: int, username: str, password: str, max_size: int = 5,
+                  timeout: float = 10.0) -> SMTPConnectionPool:
+    """Devuelve el pool compartido para (servidor, puerto, usuario), creándolo la primera vez."""
+    key = (host, port, username)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = SMTPConnectionPool(host, port, username, password, max_size, timeout)
+            _pools[key] = pool
+        return pool
@@ -1,11 +1,17 @@
 # traceability_certification/application/internal/certification_command_service.py
 
-import shortuuid
+import base64
+import secrets
+import threading
+from collections import deque
+
+from sqlalchemy import event
 from sqlalchemy.orm import Session
 from fastapi import HTTPException, status
 from datetime import datetime, timedelta, UTC
-from typing import Optional
+from typing import List, Optional
 
+from traceability_certification.application.internal.certification_query_service import evict_cached_verification
 from traceability_certification.domain.model.aggregates.certification_record import CertificationRecord
 from traceability_certification.domain.model.commands.create_certification_command import CreateCertificationCommand
 from traceability_certification.domain.services.hash_service import HashService
@@ -13,6 +19,34 @@ from traceability_certification.infrastructure.persistence.database.repositories
     CertificationRepository
 
 
+# IDs de certificado pregenerados: una sola lectura de os.urandom por cada ID_BATCH_SIZE IDs
+ID_BATCH_SIZE = 64
+_id_buffer: deque[str] = deque()
+_id_buffer_lock = threading.Lock()
+
+
+def _refill_ids(n: int = ID_BATCH_SIZE) -> None:
+    """Genera n IDs de 12 caracteres (base32, 60 bits aleatorios c/u) a partir de un único bloque aleatorio."""
+    buf = secrets.token_bytes(n * 8)
+    _id_buffer.extend(
+        base64.b32encode(buf[i * 8:(i + 1) * 8]).decode('ascii')[:12]
+        for i in range(n)
+    )
+
+
+def _next_id() -> str:
+    """Devuelve el siguiente ID aleatorio del buffer, rellenándolo cuando se agota."""
+    try:
+        return _id_buffer.popleft()
+    except IndexError:
+        with _id_buffer_lock:
+            while True:
+                try:
+                    return _id_buffer.popleft()
+                except IndexError:
+                    _refill_ids()
+
+
 class CertificationCommandService:
     """
     Servicio de aplicación para comandos de certificación
@@ -23,57 +57,38 @@ class CertificationCommandService:
         self.repository = CertificationRepository(db)
         self.hash_service = HashService()
 
-    def handle_create_certification(self, command: CreateCertificationCommand) -> CertificationRecord:
-        """
-        Crea un certificado de trazabilidad inmutable para una clasificación.
-
-        Proceso:
-        1. Valida que no exista certificado previo
-        2. Genera hash inmutable basado en datos de clasificación
-        3. Genera token de verificación pública
-        4. Persiste el certificado
-        """
-        # 1. Validar que no exista certificado previo para esta sesión
-        existing = self.repository.find_by_classification_session(command.classification_session_id)
-        if existing:
-            raise HTTPException(
-                status_code=status.HTTP_409_CONFLICT,
-                detail=f"Certification already exists for session {command.classification_session_id}"
-            )
+    def _build_certification(self, command: CreateCertificationCommand) -> CertificationRecord:
+        """Arma el agregado (hash, ID, token y expiración) sin persistirlo"""
+        # Solo lo que envió el cliente, sin agregar los campos opcionales ausentes
+        metadata = command.classification_metadata.model_dump(exclude_unset=True)
+        # El timestamp del hash debe quedar guardado para poder recalcularlo al verificar
+        if not metadata.get('completed_at'):
+            metadata['completed_at'] = datetime.now(UTC).isoformat()
+
+        # 1. Preparar datos para el hash
+        hash_data = self.hash_service.build_certification_hash_data(
+            metadata,
+            command.coffee_lot_id,
+            command.quality_score,
+            command.quality_category,
+            command.total_grains_analyzed
+        )
 
-        # 2. Preparar datos para el hash
-        hash_data = {
-            'session_id': command.classification_metadata.get('session_id_vo'),
-            'coffee_lot_id': command.coffee_lot_id,
-            'final_score': command.quality_score / 100,  # Normalizar a 0-1
-            'final_category': command.quality_category,
-            'total_grains_analyzed': command.total_grains_analyzed,
-            'timestamp': command.classification_metadata.get('completed_at') or datetime.now(UTC).isoformat(),
-            'processing_time_seconds': command.classification_metadata.get('processing_time_seconds')
-        }
-
-        # 3. Generar hash inmutable
+        # 2. Generar hash inmutable
         certification_hash = self.hash_service.generate_certification_hash(hash_data)
 
-        # 4. Verificar que el hash sea único (extremadamente improbable duplicado, pero por seguridad)
-        if self.repository.exists_by_hash(certification_hash):
-            raise HTTPException(
-                status_code=status.HTTP_409_CONFLICT,
-                detail="Hash collision detected. This is extremely rare - please retry."
-            )
-
-        # 5. Generar ID de certificado legible
-        certification_id = f"CERT-{shortuuid.uuid()[:12].upper()}"
+        # 3. Generar ID de certificado legible
+        certification_id = f"CERT-{_next_id()}"
 
-        # 6. Generar token de verificación pública
+        # 4. Generar token de verificación pública
         verification_token = self.hash_service.generate_verification_token()
 
-        # 7. Calcular fecha de expiración si aplica
+        # 5. Calcular fecha de expiración si aplica
         expires_at: Optional[datetime] = None
         if command.expires_in_days:
             expires_at = datetime.now(UTC) + timedelta(days=command.expires_in_days)
 
-        # 8. Crear el agregado
+        # 6. Crear el agregado
         certification = CertificationRecord(
             certification_id=certification_id,
             classification_session_id=command.classification_session_id,
@@ -82,7 +97,7 @@ class CertificationCommandService:
             quality_score=command.quality_score,
             quality_category=command.quality_category,
             total_grains_analyzed=command.total_grains_analyzed,
-            classification_metadata=command.classification_metadata,
+            classification_metadata=metadata,
             verification_token=verification_token
         )
 
@@ -90,9 +105,42 @@ class CertificationCommandService:
         certification.is_public = command.make_public
         certification.certification_notes = command.certification_notes
         certification.expires_at = expires_at
+        return certification
+
+    def handle_create_certification(self, command: CreateCertificationCommand) -> CertificationRecord:
+        """
+        Crea un certificado de trazabilidad inmutable para una clasificación.
 
-        # 9. Persistir
-        return self.repository.save(certification)
+        Proceso:
+        1. Genera hash inmutable basado en datos de clasificación
+        2. Genera token de verificación pública
+        3. Persiste el certificado si no existe otro para la sesión (INSERT ... ON CONFLICT)
+        """
+        certification = self._build_certification(command)
+
+        # Persistir en un solo round trip; la unicidad (sesión, hash) la garantiza la BD
+        created = self.repository.insert_if_absent(certification)
+        if created is not None:
+            return created
+
+        # Conflicto: distinguir certificado previo de la sesión de una colisión de hash/ID
+        if self.repository.find_by_classification_session(command.classification_session_id):
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail=f"Certification already exists for session {command.classification_session_id}"
+            )
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Hash collision detected. This is extremely rare - please retry."
+        )
+
+    def handle_create_certifications(self, commands: List[CreateCertificationCommand]) -> List[CertificationRecord]:
+        """
+        Crea los certificados de varias clasificaciones con un solo INSERT.
+        Las sesiones que ya tenían certificado se omiten del resultado.
+        """
+        certifications = [self._build_certification(command) for command in commands]
+        return self.repository.save_many(certifications)
 
     def handle_revoke_certification(self, certification_id: str, reason: str) -> CertificationRecord:
         """Revoca un certificado existente"""
@@ -111,4 +159,14 @@ class CertificationCommandService:
             )
 
         certification.revoke(reason)
-        return self.repository.save(certification)
\ No newline at end of file
+        certification = self.repository.save(certification)
+
+        # Invalidar las verificaciones cacheadas recién cuando el commit del request sea
+        # visible; antes, otra consulta podría volver a cachear el estado anterior
+        certification_hash, verification_token = certification.certification_hash, certification.verification_token
+        event.listen(
+            self.db, "after_commit",
+            lambda _session: evict_cached_verification(certification_hash, verification_token),
+            once=True
+        )
+        return certification
\ No newline at end of file
@@ -1,22 +1,81 @@
 # traceability_certification/application/internal/certification_query_service.py
 
-from typing import Dict, Any
+import threading
+from datetime import datetime
+from typing import Any, Dict, Iterable, Optional, Tuple
 
+from cachetools import TTLCache
 from fastapi import HTTPException, status
+from sqlalchemy import RowMapping
 from sqlalchemy.orm import Session
 
-from traceability_certification.domain.model.aggregates.certification_record import CertificationRecord
+from traceability_certification.domain.model.aggregates.certification_record import CertificationRecord, \
+    PUBLIC_VERIFICATION_COLUMNS, VERIFICATION_COLUMNS
 from traceability_certification.domain.model.queries.verify_certification_query import (
     VerifyCertificationByHashQuery,
     VerifyCertificationByTokenQuery,
     GetCertificationByIdQuery,
-    GetCertificationsByLotQuery
+    GetCertificationsByLotQuery,
+    GetPublicCertificationsQuery
 )
 from traceability_certification.domain.services.hash_service import HashService
 from traceability_certification.infrastructure.persistence.database.repositories.certification_repository import \
     CertificationRepository
 
 
+# Respuestas de verificación (por hash o token) de certificados existentes. Son las
+# consultas de los QR públicos; lo único que cambia es el estado, y la revocación
+# invalida la entrada. La expiración puede verse con hasta VERIFICATION_CACHE_TTL s de retraso.
+VERIFICATION_CACHE_TTL = 60
+_verification_cache = TTLCache(maxsize=50_000, ttl=VERIFICATION_CACHE_TTL)
+_verification_cache_lock = threading.Lock()
+
+
+def evict_cached_verification(certification_hash: str, verification_token: str) -> None:
+    """Descarta las verificaciones cacheadas de un certificado (llamar al cambiar su estado)"""
+    with _verification_cache_lock:
+        _verification_cache.pop(('hash', certification_hash), None)
+        _verification_cache.pop(('token', verification_token), None)
+
+
+def _cached_verification(key: tuple) -> Dict[str, Any] | None:
+    with _verification_cache_lock:
+        return _verification_cache.get(key)
+
+
+def _cache_verification(key: tuple, result: Dict[str, Any]) -> None:
+    with _verification_cache_lock:
+        _verification_cache[key] = result
+
+
+def encode_cursor(certified_at: datetime, certification_pk: int) -> str:
+    """Cursor opaco de paginación: posición (certified_at, id) del último elemento de la página"""
+    return f"{certified_at.isoformat()}_{certification_pk}"
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[Tuple[datetime, int]]:
+    if cursor is None:
+        return None
+    try:
+        certified_at, certification_pk = cursor.rsplit('_', 1)
+        return datetime.fromisoformat(certified_at), int(certification_pk)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid pagination cursor: {cursor}"
+        )
+
+
+def _next_cursor(page: list, limit: int) -> Optional[str]:
+    """Cursor de la página siguiente; None si la página no vino completa"""
+    if len(page) < limit:
+        return None
+    last = page[-1]
+    if isinstance(last, RowMapping):
+        return encode_cursor(last['certified_at'], last['id'])
+    return encode_cursor(last.certified_at, last.id)
+
+
 class CertificationQueryService:
     """
     Servicio de aplicación para consultas de certificación
@@ -32,7 +91,18 @@ class CertificationQueryService:
         Verifica un certificado por su hash inmutable.
         Retorna información de verificación.
         """
-        certification = self.repository.find_by_hash(query.certification_hash)
+        cache_key = ('hash', query.certification_hash)
+        if not query.deep:
+            cached_result = _cached_verification(cache_key)
+            if cached_result is not None:
+                return cached_result
+
+        # Solo la verificación profunda necesita el agregado (y sus metadatos); la normal
+        # trae únicamente las columnas de la respuesta
+        if query.deep:
+            certification = self.repository.find_by_hash(query.certification_hash)
+        else:
+            certification = self.repository.find_projection_by_hash(query.certification_hash, VERIFICATION_COLUMNS)
 
         if not certification:
             return {
@@ -41,14 +111,23 @@ class CertificationQueryService:
                 'certification_hash': query.certification_hash
             }
 
-        # Verificar integridad recalculando el hash
-        is_valid = self.hash_service.verify_hash(
-            certification.classification_metadata,
-            query.certification_hash
-        )
+        # La búsqueda por igualdad sobre el hash ya prueba la integridad: encontrar otros datos
+        # con el mismo SHA-256 es inviable. Recalcularlo desde las columnas y los metadatos
+        # guardados (que recién ahí se cargan) queda para las verificaciones explícitas (deep)
+        if query.deep:
+            hash_data = self.hash_service.build_certification_hash_data(
+                certification.classification_metadata,
+                certification.coffee_lot_id,
+                certification.quality_score,
+                certification.quality_category,
+                certification.total_grains_analyzed
+            )
+            is_valid = self.hash_service.verify_hash(hash_data, certification.certification_hash)
+        else:
+            is_valid = True
 
-        return {
-            'verified': is_valid and certification.is_valid(),
+        result = {
+            'verified': is_valid and CertificationRecord.is_valid_state(certification.status, certification.expires_at),
             'certification_id': certification.certification_id,
             'certification_hash': certification.certification_hash,
             'quality_score': certification.quality_score,
@@ -60,13 +139,24 @@ class CertificationQueryService:
             'expires_at': certification.expires_at.isoformat() if certification.expires_at else None,
             'hash_integrity_check': is_valid
         }
+        # Solo se cachea la verificación normal: la profunda no debe reemplazar su resultado
+        if not query.deep:
+            _cache_verification(cache_key, result)
+        return result
 
     def handle_verify_by_token(self, query: VerifyCertificationByTokenQuery) -> Dict[str, Any]:
         """
         Verifica un certificado por su token de verificación pública.
         Usado para QR codes y verificación sin autenticación.
         """
-        certification = self.repository.find_by_verification_token(query.verification_token)
+        cache_key = ('token', query.verification_token)
+        cached_result = _cached_verification(cache_key)
+        if cached_result is not None:
+            return cached_result
+
+        certification = self.repository.find_projection_by_verification_token(
+            query.verification_token, PUBLIC_VERIFICATION_COLUMNS
+        )
 
         if not certification:
             raise HTTPException(
@@ -75,7 +165,9 @@ class CertificationQueryService:
             )
 
         # Retornar solo datos públicos
-        return certification.get_public_verification_data()
+        result = CertificationRecord.build_public_verification_data(certification)
+        _cache_verification(cache_key, result)
+        return result
 
     def handle_get_by_id(self, query: GetCertificationByIdQuery) -> CertificationRecord:
         """Obtiene un certificado por su ID legible"""
@@ -89,18 +181,35 @@ class CertificationQueryService:
 
         return certification
 
-    def handle_get_by_lot(self, query: GetCertificationsByLotQuery) -> list[type[CertificationRecord]]:
-        """Obtiene todos los certificados de un lote de café"""
-        certifications = self.repository.find_by_coffee_lot(query.coffee_lot_id)
+    def handle_get_by_lot(self, query: GetCertificationsByLotQuery) -> Tuple[list[CertificationRecord], Optional[str]]:
+        """
+        Obtiene una página de certificados de un lote de café.
+        Retorna los certificados y el cursor de la página siguiente (None si no hay más).
+        """
+        certifications = self.repository.find_by_coffee_lot(
+            query.coffee_lot_id, query.limit, decode_cursor(query.cursor)
+        )
 
-        if not certifications:
+        if not certifications and query.cursor is None:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"No certifications found for coffee lot {query.coffee_lot_id}"
             )
 
-        return certifications
+        return certifications, _next_cursor(certifications, query.limit)
 
-    def get_all_public_certifications(self) -> list[type[CertificationRecord]]:
-        """Obtiene todos los certificados públicos (sin autenticación)"""
-        return self.repository.find_public_certifications()
\ No newline at end of file
+    def get_all_public_certifications(
+            self, query: GetPublicCertificationsQuery
+    ) -> Tuple[list[CertificationRecord], Optional[str]]:
+        """Obtiene una página de certificados públicos (sin autenticación) y el cursor siguiente"""
+        certifications = self.repository.find_public_certifications(query.limit, decode_cursor(query.cursor))
+        return certifications, _next_cursor(certifications, query.limit)
+
+    def get_all_public_certification_rows(self, columns: Iterable[str],
+                                          query: GetPublicCertificationsQuery) -> Tuple[list[RowMapping], Optional[str]]:
+        """
+        Página de certificados públicos con solo las columnas indicadas (deben incluir
+        id y certified_at), lista para serializar, y el cursor siguiente
+        """
+        rows = self.repository.find_public_certification_rows(columns, query.limit, decode_cursor(query.cursor))
+        return rows, _next_cursor(rows, query.limit)
@@ -2,8 +2,10 @@
 
 import enum
 from datetime import datetime, UTC
+from typing import Optional
 
-from sqlalchemy import Column, Integer, String, Float, DateTime, Enum as SQLEnum, ForeignKey, JSON, Boolean
+from sqlalchemy import Column, Integer, String, Float, DateTime, Enum as SQLEnum, ForeignKey, JSON, Boolean, Index
+from sqlalchemy.orm import deferred, reconstructor
 
 from shared.domain.aggregate_root import AuditableAbstractAggregateRoot
 
@@ -23,13 +25,21 @@ class CertificationRecord(AuditableAbstractAggregateRoot):
     incluyendo el hash criptográfico inmutable que garantiza la autenticidad.
     """
     __tablename__ = "certification_records"
+    __table_args__ = (
+        # Un solo certificado por sesión de clasificación (destino del INSERT ... ON CONFLICT)
+        Index("uq_certification_records_classification_session_id", "classification_session_id", unique=True),
+        # Certificados de un lote ordenados por fecha: se leen recorriendo el índice, sin sort
+        Index("ix_certification_records_coffee_lot_id_certified_at", "coffee_lot_id", "certified_at"),
+        # Listado público paginado por (certified_at, id)
+        Index("ix_certification_records_is_public_certified_at_id", "is_public", "certified_at", "id"),
+    )
 
     # Identificador único del certificado
     certification_id = Column(String(20), unique=True, nullable=False, index=True)
 
     # Referencias a otros bounded contexts
-    classification_session_id = Column(Integer, ForeignKey("classification_sessions.id"), nullable=False, index=True)
-    coffee_lot_id = Column(Integer, ForeignKey("coffee_lots.id"), nullable=False, index=True)
+    classification_session_id = Column(Integer, ForeignKey("classification_sessions.id"), nullable=False)
+    coffee_lot_id = Column(Integer, ForeignKey("coffee_lots.id"), nullable=False)
 
     # Hash inmutable (núcleo de la trazabilidad)
     certification_hash = Column(String(64), unique=True, nullable=False, index=True)
@@ -39,8 +49,9 @@ class CertificationRecord(AuditableAbstractAggregateRoot):
     quality_category = Column(String(50), nullable=False)
     total_grains_analyzed = Column(Integer, nullable=False)
 
-    # Metadatos de clasificación (almacenados para regenerar hash si es necesario)
-    classification_metadata = Column(JSON, nullable=False)
+    # Metadatos de clasificación (almacenados para regenerar hash si es necesario).
+    # Carga diferida: solo se traen al recalcular el hash, no en cada lectura del certificado
+    classification_metadata = deferred(Column(JSON, nullable=False))
 
     # Token de verificación pública (para QR codes)
     verification_token = Column(String(12), unique=True, nullable=False, index=True)
@@ -81,39 +92,82 @@ class CertificationRecord(AuditableAbstractAggregateRoot):
         self.verification_token = verification_token
         self.status = CertificationStatus.ACTIVE
         self.is_public = True
+        self._public_cache = None
+
+    @reconstructor
+    def _init_on_load(self):
+        """Inicializa la caché de datos públicos al cargar la instancia desde la BD"""
+        self._public_cache = None
 
     def revoke(self, reason: str) -> None:
         """Revoca el certificado (marca como inválido)"""
         self.status = CertificationStatus.REVOKED
         self.certification_notes = f"Revoked: {reason}"
+        self._public_cache = None
 
     def verify(self) -> None:
         """Marca el certificado como verificado externamente"""
         if self.status == CertificationStatus.ACTIVE:
             self.status = CertificationStatus.VERIFIED
+            self._public_cache = None
 
-    def is_valid(self) -> bool:
-        """Verifica si el certificado es válido"""
-        if self.status == CertificationStatus.REVOKED:
+    @staticmethod
+    def is_valid_state(status: CertificationStatus, expires_at: Optional[datetime]) -> bool:
+        """Regla de validez a partir del estado y la expiración (sirve también para proyecciones)"""
+        if status == CertificationStatus.REVOKED:
             return False
 
-        if self.expires_at and datetime.now(UTC) > self.expires_at:
+        if expires_at and datetime.now(UTC) > expires_at:
             return False
 
         return True
 
+    def is_valid(self) -> bool:
+        """Verifica si el certificado es válido"""
+        return self.is_valid_state(self.status, self.expires_at)
+
+    @staticmethod
+    def build_public_verification_data(source) -> dict:
+        """
+        Arma los datos públicos de verificación desde el agregado o desde una fila
+        proyectada con PUBLIC_VERIFICATION_COLUMNS (ambos exponen los campos como atributos).
+        """
+        return {
+            'certification_id': source.certification_id,
+            'certification_hash': source.certification_hash,
+            'quality_score': source.quality_score,
+            'quality_category': source.quality_category,
+            'total_grains_analyzed': source.total_grains_analyzed,
+            'certified_at': source.certified_at.isoformat() if source.certified_at else None,
+            'status': source.status.value,
+            'is_valid': CertificationRecord.is_valid_state(source.status, source.expires_at)
+        }
+
     def get_public_verification_data(self) -> dict:
         """
         Retorna datos públicos para verificación (sin información sensible).
         Usado para QR codes y verificación pública.
+
+        El dict se arma una vez por instancia y se reutiliza hasta que cambie el
+        estado (revoke/verify) o se cruce expires_at. No debe modificarse.
         """
-        return {
-            'certification_id': self.certification_id,
-            'certification_hash': self.certification_hash,
-            'quality_score': self.quality_score,
-            'quality_category': self.quality_category,
-            'total_grains_analyzed': self.total_grains_analyzed,
-            'certified_at': self.certified_at.isoformat() if self.certified_at else None,
-            'status': self.status.value,
-            'is_valid': self.is_valid()
-        }
\ No newline at end of file
+        if self._public_cache is None or (
+                self._public_cache['is_valid'] and self.expires_at and datetime.now(UTC) > self.expires_at
+        ):
+            self._public_cache = self.build_public_verification_data(self)
+        return self._public_cache
+
+
+# Columnas necesarias para verificar un certificado sin cargar el agregado completo
+PUBLIC_VERIFICATION_COLUMNS = (
+    'certification_id', 'certification_hash', 'quality_score', 'quality_category',
+    'total_grains_analyzed', 'certified_at', 'status', 'expires_at'
+)
+VERIFICATION_COLUMNS = PUBLIC_VERIFICATION_COLUMNS + ('is_public',)
+
+# Columnas que usan los listados (las del recurso REST): sin metadatos ni timestamps de auditoría
+LISTING_COLUMNS = (
+    'id', 'certification_id', 'certification_hash', 'classification_session_id', 'coffee_lot_id',
+    'quality_score', 'quality_category', 'total_grains_analyzed', 'verification_token', 'status',
+    'is_public', 'certified_at', 'expires_at', 'certification_notes'
+)
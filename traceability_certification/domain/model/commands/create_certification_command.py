@@ -1,7 +1,22 @@
 # traceability_certification/domain/model/commands/create_certification_command.py
 
-from pydantic import BaseModel, Field
-from typing import Optional, Dict, Any
+from pydantic import BaseModel, ConfigDict, Field
+from typing import Optional, Union
+
+
+class ClassificationMetadata(BaseModel):
+    """
+    Metadatos de la clasificación que se certifica. Los campos tipados son los que
+    usa el hash; cualquier otro dato enviado se conserva tal cual (extra='allow').
+
+    Los tipos no se convierten (un int sigue siendo int, las fechas siguen siendo
+    strings) para que el JSON canónico del hash sea el mismo que el de los datos recibidos.
+    """
+    model_config = ConfigDict(extra='allow')
+
+    session_id_vo: Optional[Union[str, int]] = Field(None, description="ID legible de la sesión (SESS-...)")
+    completed_at: Optional[str] = Field(None, description="Fecha ISO 8601 de fin de la clasificación")
+    processing_time_seconds: Optional[Union[int, float]] = None
 
 
 class CreateCertificationCommand(BaseModel):
@@ -19,7 +34,7 @@ class CreateCertificationCommand(BaseModel):
     total_grains_analyzed: int = Field(..., gt=0, description="Total de granos analizados")
 
     # Metadatos completos de la clasificación (para generar hash)
-    classification_metadata: Dict[str, Any] = Field(..., description="Metadatos completos de clasificación")
+    classification_metadata: ClassificationMetadata = Field(..., description="Metadatos completos de clasificación")
 
     # Opcionales
     make_public: bool = Field(default=True, description="Si el certificado es público")
@@ -35,10 +50,9 @@ class CreateCertificationCommand(BaseModel):
                 "quality_category": "Specialty",
                 "total_grains_analyzed": 1,
                 "classification_metadata": {
-                    "session_id": "SESS-ABC123",
-                    "final_score": 0.865,
-                    "final_category": "Specialty",
-                    "timestamp": "2025-11-28T10:00:00Z"
+                    "session_id_vo": "SESS-ABC123",
+                    "completed_at": "2025-11-28T10:00:00Z",
+                    "processing_time_seconds": 2.4
                 },
                 "make_public": True
             }
@@ -1,11 +1,14 @@
 # traceability_certification/domain/model/queries/verify_certification_query.py
 
+from typing import Optional
+
 from pydantic import BaseModel, Field
 
 
 class VerifyCertificationByHashQuery(BaseModel):
     """Query para verificar un certificado por su hash"""
     certification_hash: str = Field(..., min_length=64, max_length=64)
+    deep: bool = Field(False, description="Recalcular el hash desde las columnas y metadatos guardados")
 
 
 class VerifyCertificationByTokenQuery(BaseModel):
@@ -19,5 +22,13 @@ class GetCertificationByIdQuery(BaseModel):
 
 
 class GetCertificationsByLotQuery(BaseModel):
-    """Query para obtener todos los certificados de un lote"""
-    coffee_lot_id: int = Field(..., gt=0)
\ No newline at end of file
+    """Query para obtener los certificados de un lote (paginado por cursor)"""
+    coffee_lot_id: int = Field(..., gt=0)
+    limit: int = Field(50, gt=0, le=500)
+    cursor: Optional[str] = Field(None, description="Cursor devuelto por la página anterior")
+
+
+class GetPublicCertificationsQuery(BaseModel):
+    """Query para obtener los certificados públicos (paginado por cursor)"""
+    limit: int = Field(50, gt=0, le=500)
+    cursor: Optional[str] = Field(None, description="Cursor devuelto por la página anterior")
\ No newline at end of file
@@ -1,8 +1,83 @@
 # traceability_certification/domain/services/hash_service.py
 
 import hashlib
+import hmac
 import json
-from typing import Dict, Any
+import math
+import secrets
+import string
+from typing import Any, Dict, Tuple
+
+import orjson
+
+# Rango en el que orjson y json.dumps escriben los floats igual (fuera de él json usa
+# notación exponencial "1e-05"/"1e+16" y orjson no)
+_FLOAT_REPR_MIN = 1e-4
+_FLOAT_REPR_MAX = 1e16
+
+# Tokens de verificación pública: 12 caracteres alfanuméricos (~71 bits)
+TOKEN_LENGTH = 12
+_TOKEN_ALPHABET = string.ascii_letters + string.digits
+_TOKEN_SPACE = len(_TOKEN_ALPHABET) ** TOKEN_LENGTH
+
+# hashlib.sha256 es el EVP de OpenSSL, que ya elige en tiempo de ejecución la
+# implementación con instrucciones SHA-NI (x86) o SHA2 (ARMv8) si el CPU las tiene
+_sha256 = hashlib.sha256
+
+
+# Escalares que orjson escribe igual que json.dumps (los str con caracteres que json
+# escapa distinto se detectan en la salida)
+_PLAIN_SCALARS = frozenset((str, int, bool, type(None)))
+
+
+def _orjson_compatible(value: Any) -> bool:
+    """
+    Indica si orjson produce exactamente los mismos bytes que json.dumps para el valor,
+    de modo que los hashes ya emitidos sigan verificándose. Compara tipos exactos: las
+    subclases (enums, etc.) van siempre por json.dumps.
+    """
+    value_type = type(value)
+    if value_type in _PLAIN_SCALARS:
+        return True
+    if value_type is float:
+        # NaN no cumple ninguna comparación e inf no es < _FLOAT_REPR_MAX
+        return value == 0 or _FLOAT_REPR_MIN <= abs(value) < _FLOAT_REPR_MAX
+    if value_type is dict:
+        return all(_orjson_compatible(item) for item in value.values())
+    if value_type is list or value_type is tuple:
+        return all(_orjson_compatible(item) for item in value)
+    return False
+
+
+def _canonical_record(keys: Tuple[str, ...], values: Tuple[Any, ...]) -> bytes:
+    """
+    Serializa un registro de esquema fijo a JSON canónico (claves ordenadas, sin espacios)
+    en bytes UTF-8: mismos bytes que json.dumps(..., sort_keys=True, separators=(',', ':')).
+    Usa orjson cuando el resultado es idéntico y, si no, json.dumps.
+
+    Args:
+        keys: Claves del registro, ya en orden alfabético
+        values: Valores en el mismo orden que keys
+    """
+    record = dict(zip(keys, values))
+    if all(map(_orjson_compatible, values)):
+        try:
+            # Las claves de primer nivel ya vienen ordenadas; la opción ordena los dicts anidados
+            output = orjson.dumps(record, option=orjson.OPT_SORT_KEYS)
+        except TypeError:
+            output = None
+        # json.dumps escapa los caracteres no ASCII y DEL (0x7f) como \uXXXX; orjson no
+        if output is not None and output.isascii() and b'\x7f' not in output:
+            return output
+    return json.dumps(record, sort_keys=True, separators=(',', ':')).encode('utf-8')
+
+
+# Esquemas fijos de los hashes, en el orden que produce sort_keys=True
+_CERTIFICATION_KEYS = (
+    'coffee_lot_id', 'final_category', 'final_score', 'processing_time',
+    'session_id', 'timestamp', 'total_grains_analyzed'
+)
+_GRAIN_KEYS = ('color_percentages', 'features', 'final_category', 'final_score', 'grain_id')
 
 
 class HashService:
@@ -13,6 +88,29 @@ class HashService:
     certificaciones de calidad de granos de café.
     """
 
+    @staticmethod
+    def build_certification_hash_data(
+            classification_metadata: Dict[str, Any],
+            coffee_lot_id: int,
+            quality_score: float,
+            quality_category: str,
+            total_grains_analyzed: int
+    ) -> Dict[str, Any]:
+        """
+        Arma los datos que entran al hash de un certificado a partir de sus columnas y
+        de los metadatos guardados. Se usa al crear el certificado y al verificarlo en
+        profundidad, así ambos hashean exactamente lo mismo.
+        """
+        return {
+            'session_id': classification_metadata.get('session_id_vo'),
+            'coffee_lot_id': coffee_lot_id,
+            'final_score': quality_score / 100,  # Normalizar a 0-1
+            'final_category': quality_category,
+            'total_grains_analyzed': total_grains_analyzed,
+            'timestamp': classification_metadata.get('completed_at'),
+            'processing_time_seconds': classification_metadata.get('processing_time_seconds')
+        }
+
     @staticmethod
     def generate_certification_hash(classification_data: Dict[str, Any]) -> str:
         """
@@ -24,23 +122,19 @@ class HashService:
         Returns:
             str: Hash SHA-256 en formato hexadecimal (64 caracteres)
         """
-        # Extraer datos críticos para el hash
-        hash_input = {
-            'session_id': classification_data.get('session_id'),
-            'coffee_lot_id': classification_data.get('coffee_lot_id'),
-            'final_score': classification_data.get('final_score'),
-            'final_category': classification_data.get('final_category'),
-            'total_grains_analyzed': classification_data.get('total_grains_analyzed'),
-            'timestamp': classification_data.get('timestamp'),
-            'processing_time': classification_data.get('processing_time_seconds')
-        }
-
-        # Convertir a JSON ordenado para consistencia
-        json_string = json.dumps(hash_input, sort_keys=True, separators=(',', ':'))
+        # Extraer datos críticos para el hash, en el orden de _CERTIFICATION_KEYS
+        json_bytes = _canonical_record(_CERTIFICATION_KEYS, (
+            classification_data.get('coffee_lot_id'),
+            classification_data.get('final_category'),
+            classification_data.get('final_score'),
+            classification_data.get('processing_time_seconds'),
+            classification_data.get('session_id'),
+            classification_data.get('timestamp'),
+            classification_data.get('total_grains_analyzed')
+        ))
 
         # Generar hash SHA-256
-        hash_object = hashlib.sha256(json_string.encode('utf-8'))
-        return hash_object.hexdigest()
+        return _sha256(json_bytes).hexdigest()
 
     @staticmethod
     def verify_hash(original_data: Dict[str, Any], provided_hash: str) -> bool:
@@ -55,7 +149,8 @@ class HashService:
             bool: True si el hash es válido, False si no coincide
         """
         recalculated_hash = HashService.generate_certification_hash(original_data)
-        return recalculated_hash == provided_hash
+        # Comparación en tiempo constante: no revela cuántos caracteres coinciden
+        return hmac.compare_digest(recalculated_hash, provided_hash)
 
     @staticmethod
     def generate_verification_token() -> str:
@@ -65,11 +160,18 @@ class HashService:
         Returns:
             str: Token único de 12 caracteres
         """
-        import secrets
-        import string
-
-        alphabet = string.ascii_letters + string.digits
-        return ''.join(secrets.choice(alphabet) for _ in range(12))
+        # Una sola lectura de 9 bytes aleatorios (72 bits) codificada en base62. Los valores
+        # >= 62^12 se descartan (~32% de las veces) para que los 12 caracteres sean uniformes
+        while True:
+            n = int.from_bytes(secrets.token_bytes(9), 'big')
+            if n < _TOKEN_SPACE:
+                break
+
+        chars = []
+        for _ in range(TOKEN_LENGTH):
+            n, r = divmod(n, 62)
+            chars.append(_TOKEN_ALPHABET[r])
+        return ''.join(chars)
 
     @staticmethod
     def hash_grain_data(grain_analysis: Dict[str, Any]) -> str:
@@ -82,14 +184,10 @@ class HashService:
         Returns:
             str: Hash SHA-256 del grano individual
         """
-        grain_input = {
-            'grain_id': grain_analysis.get('id'),
-            'color_percentages': grain_analysis.get('color_percentages'),
-            'final_score': grain_analysis.get('final_score'),
-            'final_category': grain_analysis.get('final_category'),
-            'features': grain_analysis.get('features')
-        }
-
-        json_string = json.dumps(grain_input, sort_keys=True, separators=(',', ':'))
-        hash_object = hashlib.sha256(json_string.encode('utf-8'))
-        return hash_object.hexdigest()
\ No newline at end of file
+        return _sha256(_canonical_record(_GRAIN_KEYS, (
+            grain_analysis.get('color_percentages'),
+            grain_analysis.get('features'),
+            grain_analysis.get('final_category'),
+            grain_analysis.get('final_score'),
+            grain_analysis.get('id')
+        ))).hexdigest()
@@ -1,10 +1,41 @@
 # traceability_certification/infrastructure/persistence/database/repositories/certification_repository.py
 
-from typing import Optional
+from datetime import datetime
+from functools import lru_cache
+from typing import Iterable, Optional, Tuple
 
-from sqlalchemy.orm import Session
+from sqlalchemy import Row, RowMapping, bindparam, exists, func, inspect, select, tuple_
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session, load_only
 
-from traceability_certification.domain.model.aggregates.certification_record import CertificationRecord
+from traceability_certification.domain.model.aggregates.certification_record import CertificationRecord, \
+    LISTING_COLUMNS
+
+
+# Los listados cargan solo las columnas que se serializan (CertificationRecord no tiene
+# relaciones, así que no hay cargas perezosas por fila que resolver con selectinload)
+_listing_load_only = load_only(*(getattr(CertificationRecord, column) for column in LISTING_COLUMNS))
+
+
+# Búsquedas puntuales armadas una sola vez: cada llamada solo enlaza el parámetro y la
+# clave de la caché de compilación del engine ya está calculada
+def _lookup_statement(column):
+    return select(CertificationRecord).where(column == bindparam('value'))
+
+
+_BY_CERTIFICATION_ID = _lookup_statement(CertificationRecord.certification_id)
+_BY_HASH = _lookup_statement(CertificationRecord.certification_hash)
+_BY_VERIFICATION_TOKEN = _lookup_statement(CertificationRecord.verification_token)
+_BY_CLASSIFICATION_SESSION = _lookup_statement(CertificationRecord.classification_session_id)
+
+
+@lru_cache(maxsize=None)
+def _projection_statement(lookup_column: str, columns: Tuple[str, ...]):
+    """SELECT de solo `columns` filtrando por `lookup_column`, construido una vez por combinación"""
+    return (
+        select(*(getattr(CertificationRecord, name) for name in columns))
+        .where(getattr(CertificationRecord, lookup_column) == bindparam('value'))
+    )
 
 
 class CertificationRepository:
@@ -16,62 +47,138 @@ class CertificationRepository:
         self.db = db
 
     def save(self, certification: CertificationRecord) -> CertificationRecord:
-        """Guarda o actualiza un certificado"""
+        """
+        Guarda o actualiza un certificado. Solo hace flush (asigna el ID y los defaults);
+        el commit lo hace la unit of work del request (get_db)
+        """
         self.db.add(certification)
-        self.db.commit()
-        self.db.refresh(certification)
+        self.db.flush()
         return certification
 
+    @staticmethod
+    def _column_values(certification: CertificationRecord) -> dict:
+        """Valores de columna ya asignados (los None se dejan a los defaults de la columna)"""
+        return {
+            attr.key: getattr(certification, attr.key)
+            for attr in inspect(CertificationRecord).column_attrs
+            if getattr(certification, attr.key) is not None
+        }
+
+    def insert_if_absent(self, certification: CertificationRecord) -> Optional[CertificationRecord]:
+        """
+        Inserta el certificado en un solo round trip (INSERT ... ON CONFLICT DO NOTHING RETURNING).
+        Retorna None si ya existía un certificado con la misma sesión, hash, ID o token.
+        El commit lo hace la unit of work del request (get_db).
+        """
+        stmt = (
+            insert(CertificationRecord)
+            .values(**self._column_values(certification))
+            .on_conflict_do_nothing()
+            .returning(CertificationRecord)
+        )
+        return self.db.scalars(stmt).one_or_none()
+
+    def save_many(self, certifications: list[CertificationRecord]) -> list[CertificationRecord]:
+        """
+        Inserta varios certificados con un INSERT multi-fila (ON CONFLICT DO NOTHING RETURNING),
+        sin commit (lo hace la unit of work del request). Retorna solo los insertados, en el
+        orden recibido; los que chocan con un certificado existente (misma sesión, hash, ID
+        o token) se omiten.
+        """
+        if not certifications:
+            return []
+
+        stmt = (
+            insert(CertificationRecord)
+            .on_conflict_do_nothing()
+            .returning(CertificationRecord, sort_by_parameter_order=True)
+        )
+        return list(self.db.scalars(stmt, [self._column_values(cert) for cert in certifications]))
+
     def find_by_id(self, certification_id: int) -> Optional[CertificationRecord]:
-        """Busca certificado por ID numérico"""
-        return self.db.query(CertificationRecord).filter(
-            CertificationRecord.id == certification_id
-        ).first()
+        """Busca certificado por ID numérico (usa el identity map de la sesión si ya está cargado)"""
+        return self.db.get(CertificationRecord, certification_id)
 
     def find_by_certification_id(self, certification_id: str) -> Optional[CertificationRecord]:
         """Busca certificado por ID legible (CERT-...)"""
-        return self.db.query(CertificationRecord).filter(
-            CertificationRecord.certification_id == certification_id
-        ).first()
+        return self.db.scalars(_BY_CERTIFICATION_ID, {'value': certification_id}).first()
 
     def find_by_hash(self, certification_hash: str) -> Optional[CertificationRecord]:
         """Busca certificado por hash inmutable"""
-        return self.db.query(CertificationRecord).filter(
-            CertificationRecord.certification_hash == certification_hash
-        ).first()
+        return self.db.scalars(_BY_HASH, {'value': certification_hash}).first()
 
     def find_by_verification_token(self, token: str) -> Optional[CertificationRecord]:
         """Busca certificado por token de verificación pública"""
-        return self.db.query(CertificationRecord).filter(
-            CertificationRecord.verification_token == token
-        ).first()
+        return self.db.scalars(_BY_VERIFICATION_TOKEN, {'value': token}).first()
+
+    def find_projection_by_hash(self, certification_hash: str, columns: Tuple[str, ...]) -> Optional[Row]:
+        """Busca por hash trayendo solo las columnas indicadas (sin hidratar el agregado)"""
+        stmt = _projection_statement('certification_hash', columns)
+        return self.db.execute(stmt, {'value': certification_hash}).first()
+
+    def find_projection_by_verification_token(self, token: str, columns: Tuple[str, ...]) -> Optional[Row]:
+        """Busca por token de verificación trayendo solo las columnas indicadas (sin hidratar el agregado)"""
+        stmt = _projection_statement('verification_token', columns)
+        return self.db.execute(stmt, {'value': token}).first()
 
     def find_by_classification_session(self, session_id: int) -> Optional[CertificationRecord]:
         """Busca certificado por sesión de clasificación"""
-        return self.db.query(CertificationRecord).filter(
-            CertificationRecord.classification_session_id == session_id
-        ).first()
-
-    def find_by_coffee_lot(self, coffee_lot_id: int) -> list[type[CertificationRecord]]:
-        """Obtiene todos los certificados de un lote de café"""
-        return self.db.query(CertificationRecord).filter(
-            CertificationRecord.coffee_lot_id == coffee_lot_id
-        ).order_by(CertificationRecord.certified_at.desc()).all()
-
-    def find_public_certifications(self) -> list[type[CertificationRecord]]:
-        """Obtiene todos los certificados públicos"""
-        return self.db.query(CertificationRecord).filter(
-            CertificationRecord.is_public == True
-        ).order_by(CertificationRecord.certified_at.desc()).all()
+        return self.db.scalars(_BY_CLASSIFICATION_SESSION, {'value': session_id}).first()
+
+    @staticmethod
+    def _keyset_page(stmt, limit: int, cursor: Optional[Tuple[datetime, int]]):
+        """
+        Página ordenada por (certified_at, id) descendente que empieza después del cursor:
+        WHERE (certified_at, id) < (:certified_at, :id) ... LIMIT, sin OFFSET
+        """
+        if cursor is not None:
+            stmt = stmt.where(tuple_(CertificationRecord.certified_at, CertificationRecord.id) < cursor)
+        return stmt.order_by(
+            CertificationRecord.certified_at.desc(), CertificationRecord.id.desc()
+        ).limit(limit)
+
+    def find_by_coffee_lot(self, coffee_lot_id: int, limit: int = 50,
+                           cursor: Optional[Tuple[datetime, int]] = None) -> list[CertificationRecord]:
+        """Obtiene una página de certificados de un lote de café, del más reciente al más antiguo"""
+        stmt = (
+            select(CertificationRecord)
+            .options(_listing_load_only)
+            .where(CertificationRecord.coffee_lot_id == coffee_lot_id)
+        )
+        return list(self.db.scalars(self._keyset_page(stmt, limit, cursor)))
+
+    def find_public_certifications(self, limit: int = 50,
+                                   cursor: Optional[Tuple[datetime, int]] = None) -> list[CertificationRecord]:
+        """Obtiene una página de certificados públicos"""
+        stmt = (
+            select(CertificationRecord)
+            .options(_listing_load_only)
+            .where(CertificationRecord.is_public == True)
+        )
+        return list(self.db.scalars(self._keyset_page(stmt, limit, cursor)))
+
+    def find_public_certification_rows(self, columns: Iterable[str], limit: int = 50,
+                                       cursor: Optional[Tuple[datetime, int]] = None) -> list[RowMapping]:
+        """
+        Obtiene una página con solo las columnas pedidas de los certificados públicos,
+        como mappings (sin instanciar el agregado ni cargar los metadatos)
+        """
+        stmt = (
+            select(*(getattr(CertificationRecord, column) for column in columns))
+            .where(CertificationRecord.is_public == True)
+        )
+        return list(self.db.execute(self._keyset_page(stmt, limit, cursor)).mappings())
 
     def exists_by_hash(self, certification_hash: str) -> bool:
-        """Verifica si existe un certificado con el hash dado"""
-        return self.db.query(CertificationRecord).filter(
+        """Verifica si existe un certificado con el hash dado (SELECT EXISTS, sin traer la fila)"""
+        return self.db.scalar(select(exists().where(
             CertificationRecord.certification_hash == certification_hash
-        ).first() is not None
+        )))
 
     def count_by_coffee_lot(self, coffee_lot_id: int) -> int:
-        """Cuenta certificados de un lote"""
-        return self.db.query(CertificationRecord).filter(
-            CertificationRecord.coffee_lot_id == coffee_lot_id
-        ).count()
\ No newline at end of file
+        """Cuenta certificados de un lote (COUNT directo sobre el índice, sin subconsulta)"""
+        return self.db.scalar(
+            select(func.count())
+            .select_from(CertificationRecord)
+            .where(CertificationRecord.coffee_lot_id == coffee_lot_id)
+        )
@@ -3,22 +3,30 @@
 from datetime import datetime
 from typing import List, Optional
 
-from fastapi import APIRouter, Depends, Path, status, Body
-from pydantic import BaseModel, Field
+from fastapi import APIRouter, Depends, Path, Query, Request, Response, status, Body
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel, ConfigDict, Field
 from sqlalchemy.orm import Session
 
-from shared.domain.database import get_db
+from shared.domain.database import get_db, get_ro_db
 from traceability_certification.application.internal.certification_command_service import CertificationCommandService
-from traceability_certification.application.internal.certification_query_service import CertificationQueryService
+from traceability_certification.application.internal.certification_query_service import CertificationQueryService, \
+    VERIFICATION_CACHE_TTL
 from traceability_certification.domain.model.commands.create_certification_command import CreateCertificationCommand
 from traceability_certification.domain.model.queries.verify_certification_query import (
     VerifyCertificationByHashQuery,
     VerifyCertificationByTokenQuery,
     GetCertificationByIdQuery,
-    GetCertificationsByLotQuery
+    GetCertificationsByLotQuery,
+    GetPublicCertificationsQuery
 )
 
-router = APIRouter(prefix="/api/v1/certifications", tags=["Traceability & Certification"])
+router = APIRouter(
+    prefix="/api/v1/certifications",
+    tags=["Traceability & Certification"],
+    default_response_class=ORJSONResponse
+)
 
 
 # ============ DTOs / Resources ============
@@ -40,8 +48,7 @@ class CertificationResource(BaseModel):
     expires_at: Optional[datetime]
     certification_notes: Optional[str]
 
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 class VerificationResponse(BaseModel):
@@ -79,11 +86,49 @@ def get_command_service(db: Session = Depends(get_db)) -> CertificationCommandSe
     return CertificationCommandService(db)
 
 
-def get_query_service(db: Session = Depends(get_db)) -> CertificationQueryService:
+def get_query_service(db: Session = Depends(get_ro_db)) -> CertificationQueryService:
     return CertificationQueryService(db)
 
 
+# ============ HTTP caching ============
+
+# Misma vigencia que la caché de verificaciones: un revoke se ve como máximo con ese retraso.
+# Los certificados no públicos solo se cachean en el cliente, nunca en proxies/CDN
+CACHE_CONTROL = f"public, max-age={VERIFICATION_CACHE_TTL}"
+PRIVATE_CACHE_CONTROL = f"private, max-age={VERIFICATION_CACHE_TTL}"
+
+
+def _not_modified(request: Request, response: Response, certification_hash: str, state: str,
+                  cache_control: str = CACHE_CONTROL) -> bool:
+    """
+    Agrega ETag y Cache-Control a la respuesta. El ETag combina el hash (inmutable) con
+    el estado/validez, lo único que cambia en un certificado. Retorna True si el cliente
+    ya tiene esa versión (If-None-Match) y basta con responder 304.
+    """
+    etag = f'"{certification_hash}-{state}"'
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = cache_control
+    return request.headers.get("if-none-match") == etag
+
+
+def _not_modified_response(response: Response) -> Response:
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=dict(response.headers))
+
+
+# Las listas se paginan por cursor; el de la página siguiente viaja en este header
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def _set_next_cursor(response: Response, next_cursor: Optional[str]) -> None:
+    if next_cursor is not None:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+
+
 # ============ Endpoints ============
+# Los servicios usan la Session síncrona de SQLAlchemy: se ejecutan en el threadpool
+# para que la espera de la base de datos no bloquee el event loop.
+# Las queries se arman con model_construct: FastAPI ya validó los mismos parámetros
+# con las mismas restricciones (Path/Query), no hace falta volver a validarlos
 
 @router.post("", response_model=CertificationResource, status_code=status.HTTP_201_CREATED)
 async def create_certification(
@@ -98,13 +143,28 @@ async def create_certification(
     - ID de certificado único (CERT-...)
     - Token de verificación pública
     """
-    certification = service.handle_create_certification(command)
-    return CertificationResource.model_validate(certification)
+    return await run_in_threadpool(service.handle_create_certification, command)
+
+
+@router.post("/batch", response_model=List[CertificationResource], status_code=status.HTTP_201_CREATED)
+async def create_certifications_batch(
+        commands: List[CreateCertificationCommand] = Body(..., min_length=1, max_length=500),
+        service: CertificationCommandService = Depends(get_command_service)
+):
+    """
+    Crea certificados para varias clasificaciones en una sola operación.
+
+    Las sesiones que ya tenían certificado se omiten de la respuesta.
+    """
+    return await run_in_threadpool(service.handle_create_certifications, commands)
 
 
 @router.get("/verify/hash/{certification_hash}", response_model=VerificationResponse)
 async def verify_certification_by_hash(
+        request: Request,
+        response: Response,
         certification_hash: str = Path(..., min_length=64, max_length=64),
+        deep: bool = Query(False, description="Recalcular el hash desde las columnas y metadatos guardados"),
         service: CertificationQueryService = Depends(get_query_service)
 ):
     """
@@ -115,13 +175,20 @@ async def verify_certification_by_hash(
     - Integridad del hash (recalcula y compara)
     - Validez del certificado (no revocado, no expirado)
     """
-    query = VerifyCertificationByHashQuery(certification_hash=certification_hash)
-    result = service.handle_verify_by_hash(query)
-    return VerificationResponse(**result)
+    query = VerifyCertificationByHashQuery.model_construct(certification_hash=certification_hash, deep=deep)
+    result = await run_in_threadpool(service.handle_verify_by_hash, query)
+    if 'status' in result and _not_modified(
+            request, response, result['certification_hash'], f"{result['status']}-{result['verified']}"
+    ):
+        return _not_modified_response(response)
+    # FastAPI valida y filtra el dict con response_model una sola vez
+    return result
 
 
 @router.get("/verify/token/{verification_token}", response_model=PublicVerificationResponse)
 async def verify_certification_by_token(
+        request: Request,
+        response: Response,
         verification_token: str = Path(..., min_length=12, max_length=12),
         service: CertificationQueryService = Depends(get_query_service)
 ):
@@ -131,31 +198,47 @@ async def verify_certification_by_token(
     Endpoint público (sin autenticación) para QR codes.
     Retorna solo datos no sensibles.
     """
-    query = VerifyCertificationByTokenQuery(verification_token=verification_token)
-    result = service.handle_verify_by_token(query)
-    return PublicVerificationResponse(**result)
+    query = VerifyCertificationByTokenQuery.model_construct(verification_token=verification_token)
+    result = await run_in_threadpool(service.handle_verify_by_token, query)
+    if _not_modified(request, response, result['certification_hash'], f"{result['status']}-{result['is_valid']}"):
+        return _not_modified_response(response)
+    return result
 
 
 @router.get("/{certification_id}", response_model=CertificationResource)
 async def get_certification_by_id(
+        request: Request,
+        response: Response,
         certification_id: str = Path(..., description="ID del certificado (CERT-...)"),
         service: CertificationQueryService = Depends(get_query_service)
 ):
     """Obtiene un certificado específico por su ID"""
-    query = GetCertificationByIdQuery(certification_id=certification_id)
-    certification = service.handle_get_by_id(query)
-    return CertificationResource.model_validate(certification)
+    query = GetCertificationByIdQuery.model_construct(certification_id=certification_id)
+    certification = await run_in_threadpool(service.handle_get_by_id, query)
+    cache_control = CACHE_CONTROL if certification.is_public else PRIVATE_CACHE_CONTROL
+    if _not_modified(request, response, certification.certification_hash, certification.status.value, cache_control):
+        return _not_modified_response(response)
+    return certification
 
 
 @router.get("/lot/{coffee_lot_id}", response_model=List[CertificationResource])
 async def get_certifications_by_lot(
+        response: Response,
         coffee_lot_id: int = Path(..., gt=0, description="ID del lote de café"),
+        limit: int = Query(50, gt=0, le=500, description="Tamaño de página"),
+        cursor: Optional[str] = Query(None, description=f"Valor del header {NEXT_CURSOR_HEADER} de la página anterior"),
         service: CertificationQueryService = Depends(get_query_service)
 ):
-    """Obtiene todos los certificados de un lote de café"""
-    query = GetCertificationsByLotQuery(coffee_lot_id=coffee_lot_id)
-    certifications = service.handle_get_by_lot(query)
-    return [CertificationResource.model_validate(cert) for cert in certifications]
+    """
+    Obtiene los certificados de un lote de café, del más reciente al más antiguo.
+
+    Paginado por cursor: si hay más resultados, la respuesta incluye el header
+    X-Next-Cursor para pedir la página siguiente.
+    """
+    query = GetCertificationsByLotQuery.model_construct(coffee_lot_id=coffee_lot_id, limit=limit, cursor=cursor)
+    certifications, next_cursor = await run_in_threadpool(service.handle_get_by_lot, query)
+    _set_next_cursor(response, next_cursor)
+    return certifications
 
 
 @router.patch("/{certification_id}/revoke", response_model=CertificationResource)
@@ -169,18 +252,26 @@ async def revoke_certification(
 
     Un certificado revocado permanece en la base de datos, pero ya no se considera válido.
     """
-    certification = service.handle_revoke_certification(certification_id, request.reason)
-    return CertificationResource.model_validate(certification)
+    return await run_in_threadpool(service.handle_revoke_certification, certification_id, request.reason)
 
 
 @router.get("", response_model=List[CertificationResource])
 async def get_all_public_certifications(
+        limit: int = Query(50, gt=0, le=500, description="Tamaño de página"),
+        cursor: Optional[str] = Query(None, description=f"Valor del header {NEXT_CURSOR_HEADER} de la página anterior"),
         service: CertificationQueryService = Depends(get_query_service)
 ):
     """
-    Obtiene todos los certificados públicos.
+    Obtiene los certificados públicos, del más reciente al más antiguo.
 
     Endpoint sin autenticación para transparencia pública.
+    Lee solo las columnas del recurso y las serializa directo con orjson, sin Pydantic.
+    Paginado por cursor (header X-Next-Cursor).
     """
-    certifications = service.get_all_public_certifications()
-    return [CertificationResource.model_validate(cert) for cert in certifications]
\ No newline at end of file
+    query = GetPublicCertificationsQuery.model_construct(limit=limit, cursor=cursor)
+    rows, next_cursor = await run_in_threadpool(
+        service.get_all_public_certification_rows, CertificationResource.model_fields, query
+    )
+    response = ORJSONResponse([dict(row) for row in rows])
+    _set_next_cursor(response, next_cursor)
+    return response